@@ -0,0 +1,78 @@
+from array import array
+from typing import Optional
+
+# Each entry takes two 64-bit words: the hash key and the score
+ENTRY_BYTES = 16
+
+# Entries per set. Lookups compare every way of one set, so keep this small.
+DEFAULT_WAYS = 4
+
+
+class EvalCache:
+    """Fixed-size cache of evaluation scores keyed by a 64-bit hash: whole
+    static evaluations by Zobrist key, or pawn structure scores by pawn key.
+    Key 0 marks an empty entry and must not be stored.
+
+    The cache is set-associative: a key maps to one set of `ways` entries,
+    kept in most recently used order. A hit moves the entry to the front and
+    a new entry evicts the least recently used one. Memory is preallocated
+    from size_mb, so it doesn't grow however many positions are evaluated.
+
+    hits, misses and evictions count lookups since the last clear().
+    """
+
+    def __init__(self, size_mb: int = 4, ways: int = DEFAULT_WAYS):
+        entries = max(ways, (size_mb * 1024 * 1024) // ENTRY_BYTES)
+        # Round the number of sets down to a power of two so the index is a simple mask
+        sets = 1 << ((entries // ways).bit_length() - 1)
+        self.ways = ways
+        self.size = sets * ways
+        self.mask = sets - 1
+        self.clear()
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        self.keys = array('Q', bytes(8 * self.size))
+        self.scores = array('q', bytes(8 * self.size))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def probe(self, key: int) -> Optional[int]:
+        """Return the cached score for key, or None."""
+        keys = self.keys
+        base = (key & self.mask) * self.ways
+        for i in range(base, base + self.ways):
+            if keys[i] == key:
+                scores = self.scores
+                score = scores[i]
+                # Move to the front of the set
+                while i > base:
+                    keys[i] = keys[i - 1]
+                    scores[i] = scores[i - 1]
+                    i -= 1
+                keys[base] = key
+                scores[base] = score
+                self.hits += 1
+                return score
+        self.misses += 1
+        return None
+
+    def store(self, key: int, score: int):
+        """Insert a score that probe() just missed, evicting the least recently used entry."""
+        keys = self.keys
+        scores = self.scores
+        base = (key & self.mask) * self.ways
+        i = base + self.ways - 1
+        if keys[i]:
+            self.evictions += 1
+        while i > base:
+            keys[i] = keys[i - 1]
+            scores[i] = scores[i - 1]
+            i -= 1
+        keys[base] = key
+        scores[base] = score
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
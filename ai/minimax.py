@@ -1,104 +1,830 @@
 import chess
-from typing import Tuple, Optional, List
+import chess.polyglot
+import multiprocessing
+import queue
+import threading
+from typing import Any, Callable, Dict, Tuple, Optional, List
 import random
-from game.move_generator import evaluate_board
+import time
+from game.move_generator import material_score, mobility_score, pawn_structure_score, PIECE_VALUES
+from ai.transposition import TranspositionTable, EXACT, LOWER, UPPER, decode_move, encode_move
+from ai.position import Position
+from ai.nnue import Network, NNUEPosition
+from ai.eval_cache import EvalCache
+from ai.move_ordering import (MoveOrderer, MovePicker, MAX_PLY, CHECK_SCORE, STAGE_QUIETS,
+                               pick_next)
+
+# Deepest iteration searched when no depth limit is given
+MAX_SEARCH_DEPTH = 64
+
+# Check the clock and node budget every this many nodes (must be 2^n - 1)
+_LIMIT_CHECK_MASK = 127
+
+# Scores are integer centipawns from the side to move's perspective
+INFINITE_SCORE = 100000
+MATE_SCORE = 10000  # Same magnitude as evaluate_board's checkmate score
+MATE_BOUND = MATE_SCORE - MAX_SEARCH_DEPTH  # Scores beyond this are forced mates
+
+# Half-width of the root aspiration window around the previous iteration's score
+ASPIRATION_WINDOW = 50
+
+# Null-move pruning: minimum depth and depth reduction
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2
+
+# Late move reductions: minimum depth, and how many moves are searched in full first
+LMR_MIN_DEPTH = 3
+LMR_FULL_DEPTH_MOVES = 3
+
+# Minimum seconds between search info reports, so reporting costs no search time
+INFO_INTERVAL = 0.1
+
+# Seconds between liveness checks while waiting for Lazy SMP helper results
+HELPER_POLL_INTERVAL = 1.0
+
+# Frontier pruning margins by remaining depth (1 and 2), in PIECE_VALUES units.
+# Futility skips quiet moves when static eval + margin can't reach alpha;
+# razoring drops straight into quiescence when the deficit is even larger.
+FUTILITY_MARGINS = (0, PIECE_VALUES[chess.KNIGHT], PIECE_VALUES[chess.ROOK])
+RAZOR_MARGINS = (0, PIECE_VALUES[chess.ROOK], PIECE_VALUES[chess.QUEEN])
+
+
+class SearchLimit:
+    """Limits for a single search. Any combination may be given; the search
+    stops at whichever is reached first.
+
+    time  -- seconds of thinking time
+    nodes -- maximum number of nodes to visit
+    depth -- maximum iterative deepening depth, clamped to 1..MAX_SEARCH_DEPTH
+    """
+
+    def __init__(self, time: Optional[float] = None, nodes: Optional[int] = None,
+                 depth: Optional[int] = None):
+        self.time = time
+        self.nodes = nodes
+        self.depth = depth
+
+    def __repr__(self):
+        return f"SearchLimit(time={self.time}, nodes={self.nodes}, depth={self.depth})"
+
+
+class AnalysisLine:
+    """One line of a Multi-PV search: a root move, its exact score in
+    centipawns from the side to move's perspective, and the principal
+    variation starting with the move."""
+
+    def __init__(self, move: chess.Move, score: int, pv: List[chess.Move]):
+        self.move = move
+        self.score = score
+        self.pv = pv
+
+    def __repr__(self):
+        return f"AnalysisLine(move={self.move}, score={self.score}, pv={[move.uci() for move in self.pv]})"
+
+
+class _SearchAborted(Exception):
+    """Raised inside the search when the time or node budget runs out."""
+
 
 class MinimaxAI:
-    def __init__(self, max_depth: int = 4, ai_color: chess.Color = chess.BLACK):
+    def __init__(self, max_depth: int = 4, ai_color: chess.Color = chess.BLACK,
+                 tt_size_mb: int = 16, eval_cache_mb: int = 4, pawn_hash_mb: int = 1,
+                 null_move: bool = True, late_move_reductions: bool = True,
+                 futility_pruning: bool = True, razoring: bool = True,
+                 check_incremental: bool = False, nnue: Optional[Network] = None,
+                 workers: int = 1):
         self.max_depth = max_depth
         self.ai_color = ai_color
-        self.nodes_evaluated = 0
+        # Selective search features, switchable to measure their effect
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+        self.futility_pruning = futility_pruning
+        self.razoring = razoring
+        # Debug mode: verify the incremental material score, Zobrist keys and
+        # NNUE accumulators against a full recomputation at every node
+        self.check_incremental = check_incremental
+        # Neural evaluation backend (see ai/nnue.py); None uses the classical evaluation
+        self.nnue = nnue
+        self.nodes_evaluated = 0  # Main search nodes
+        self.qnodes_evaluated = 0  # Quiescence search nodes
+        # Lazy SMP: with more than one worker, helper processes search the same
+        # root alongside this one and share its transposition table
+        self.workers = max(1, workers)
+        self.tt = TranspositionTable(tt_size_mb, shared=self.workers > 1)
+        self._helper_settings = dict(max_depth=max_depth, eval_cache_mb=eval_cache_mb,
+                                     pawn_hash_mb=pawn_hash_mb, null_move=null_move,
+                                     late_move_reductions=late_move_reductions,
+                                     futility_pruning=futility_pruning, razoring=razoring, nnue=nnue)
+        self._helpers: Optional[_HelperPool] = None  # Started by the first parallel search
+        self._helper_id = 0  # Nonzero in helper processes
+        self.helper_nodes = 0  # Nodes searched by the helpers in the last search
+        # The opponent's expected reply to the last best move, for pondering
+        self.ponder_move: Optional[chess.Move] = None
+        # Static evaluations, kept across searches (0 MB disables the cache)
+        self.eval_cache = EvalCache(eval_cache_mb) if eval_cache_mb else None
+        # Pawn structure scores by pawn key. Pawns move rarely, so most lookups hit.
+        self.pawn_hash = EvalCache(pawn_hash_mb, ways=1) if pawn_hash_mb else None
+        self.ordering = MoveOrderer()
+        # Move pickers and quiescence move lists reused at each ply, so nodes don't allocate them
+        self._pickers = [MovePicker(self.ordering) for _ in range(MAX_PLY)]
+        # Zobrist keys along the current search path, by ply, and of the game
+        # positions before the root, for repetition detection
+        self._path_keys = [0] * (MAX_PLY + 1)
+        self._history_keys: List[int] = []
+        self._ply_moves = [[] for _ in range(MAX_PLY)]
+        self._ply_scores = [[] for _ in range(MAX_PLY)]
+        # Results of the last search
+        self.completed_depth = 0
+        self.best_score = 0
+        self.principal_variation: List[chess.Move] = []
+        # Best root moves of the last search, best first: multi_pv of them
+        self.lines: List[AnalysisLine] = []
+        self._multi_pv = 1
+        # Budget of the running search
+        self._deadline = None
+        self._node_limit = None
+        self._stop = None
+        # Info reporting of the running search
+        self._info: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._start_time = 0.0
+        self._next_info = 0.0
 
     def set_ai_color(self, color: chess.Color):
         """Set the AI's color."""
         self.ai_color = color
 
-    def find_best_move(self, board: chess.Board) -> Optional[chess.Move]:
-        """Find the best move using minimax with alpha-beta pruning."""
+    def find_best_move(self, board: chess.Board, limit: Optional[SearchLimit] = None,
+                       stop: Optional[threading.Event] = None,
+                       info: Optional[Callable[[Dict[str, Any]], None]] = None,
+                       multi_pv: int = 1) -> Optional[chess.Move]:
+        """Find the best move using iterative deepening principal variation search.
+
+        Without a limit the search goes to max_depth. With a limit, the move from
+        the deepest fully completed iteration is returned.
+
+        stop is checked with the limits, every few hundred nodes: once it is
+        set, the search returns its best move so far within milliseconds. Any
+        object with an is_set() method will do, such as a threading.Event.
+
+        info, if given, is called with a dict of the search's progress: depth,
+        score, mate (moves to mate, negative when getting mated, or None), pv
+        (list of moves), nodes, nps, hashfull (permille) and time. It is
+        called after completed iterations and while a long one runs, at most
+        every INFO_INTERVAL seconds, and always once when the search ends.
+
+        With multi_pv above 1, each iteration also searches the next best root
+        moves, each with a full aspiration search of the moves left, so they
+        get exact scores. The lines of the deepest completed iteration are
+        left in self.lines; analyse() returns them directly. Fewer lines are
+        left when the search is cut short during the first iteration.
+        """
+        # Results of the last search are cleared first, so none are left
+        # over when the game has already ended
+        self.nodes_evaluated = 0
+        self.qnodes_evaluated = 0
+        self.completed_depth = 0
+        self.best_score = 0
+        self.principal_variation = []
+        self.lines = []
+        self.ponder_move = None
+        self.helper_nodes = 0
         if board.is_game_over():
             return None
 
+        if limit is None:
+            limit = SearchLimit(depth=self.max_depth)
+        # A depth below 1 still searches one ply, so a move is always found
+        max_depth = (max(1, min(limit.depth, MAX_SEARCH_DEPTH)) if limit.depth is not None
+                     else MAX_SEARCH_DEPTH)
+        start_time = time.monotonic()
+        self._deadline = start_time + limit.time if limit.time is not None else None
+        self._node_limit = limit.nodes
+        self._stop = stop
+        self._info = info
+        self._start_time = start_time
+        self._next_info = start_time + INFO_INTERVAL
+
         # Update AI color based on whose turn it is
         self.ai_color = board.turn
         
-        self.nodes_evaluated = 0
-        best_move = None
-        best_value = float('-inf')
-        alpha = float('-inf')
-        beta = float('inf')
-
-        # Get all legal moves and order them
-        legal_moves = list(board.legal_moves)
-        ordered_moves = self._order_moves(board, legal_moves)
-
-        # Evaluate each move from AI's perspective
-        for move in ordered_moves:
-            # Create a copy of the board for this search branch
-            board_copy = board.copy()
-            board_copy.push(move)
-            # AI is maximizing player, opponent is minimizing
-            value = self._minimax(board_copy, self.max_depth - 1, alpha, beta, False, self.ai_color)
-            # No board.pop() needed on the original board, as we used a copy
+        self._multi_pv = max(1, multi_pv)
+        if not self._helper_id:
+            # Helpers get the main search's generation with their job
+            self.tt.new_search()
+        self.ordering.age()
+
+        # The search runs on its own compact Position with moves as ints; the
+        # caller's board is never modified
+        if self.nnue is not None:
+            position = NNUEPosition.from_board(board, self.nnue)
+        else:
+            position = Position.from_board(board)
+        self._history_keys = _game_history_keys(board)
+
+        # Get all legal moves and order them, trying the stored best move first
+        key = position.key
+        entry = self.tt.probe(key)
+        root_moves = []
+        position.generate_moves(root_moves)
+        root_moves = self.ordering.order_moves(position, root_moves, entry[3] if entry else 0)
+        self._path_keys[0] = key
+        first_depth = 1
+        if self._helper_id:
+            # Helpers shuffle the root moves after the first, and odd helpers
+            # start a ply deeper, so they spread over the tree instead of
+            # repeating the main search
+            rest = root_moves[1:]
+            random.Random(self._helper_id).shuffle(rest)
+            root_moves[1:] = rest
+            first_depth += self._helper_id & 1
+
+        helpers = None
+        if self.workers > 1:
+            if self._helpers is None:
+                self._helpers = _HelperPool(self.workers - 1, self.tt, self._helper_settings)
+            helpers = self._helpers
+            helpers.start(board, limit, self.tt.generation)
+        try:
+            best_move = self._iterative_deepening(position, root_moves, first_depth, max_depth,
+                                                  limit, start_time)
+        finally:
+            if helpers is not None:
+                results = helpers.finish()
+        if helpers is not None:
+            # Return the deepest completed result; the main search wins ties
+            self.helper_nodes = 0
+            for move, depth, score, nodes in results:
+                self.helper_nodes += nodes
+                # Helpers search a single line, so only a single-line search takes theirs
+                if depth > self.completed_depth and self._multi_pv == 1:
+                    best_move, self.completed_depth, self.best_score = move, depth, score
+                    self.principal_variation = self._pv_from_tt(Position.from_board(board), move,
+                                                                depth)
+                    self.lines = [AnalysisLine(decode_move(move), score, self.principal_variation)]
+        if not self.lines:
+            # Cut short before the first iteration completed: the returned
+            # move alone, scored by the static evaluation after it. The
+            # search position may be mid-line after the abort, so use a fresh one.
+            position = (NNUEPosition.from_board(board, self.nnue) if self.nnue is not None
+                        else Position.from_board(board))
+            position.push(best_move)
+            move = decode_move(best_move)
+            self.lines = [AnalysisLine(move, -self._evaluate(position), [move])]
+
+        self.ponder_move = None if self._helper_id else self._expected_reply(board, best_move)
+        if not self._helper_id:
+            helper_info = f", helpers: {self.helper_nodes}" if helpers is not None else ""
+            print(f"Nodes evaluated: {self.nodes_evaluated} (quiescence: {self.qnodes_evaluated}{helper_info})")
+        if info is not None:
+            self._report_info(time.monotonic())
+        self._info = None
+        return decode_move(best_move)
+
+    def analyse(self, board: chess.Board, multi_pv: int, limit: Optional[SearchLimit] = None,
+                stop: Optional[threading.Event] = None) -> List[AnalysisLine]:
+        """The best multi_pv root moves of board, best first, from one search.
+        Fewer lines come back when there are fewer legal moves, and none when
+        the game is over. If the limit or stop cuts the search short before
+        its first iteration completes (completed_depth is 0), the only line
+        is the move find_best_move returns, with its static evaluation."""
+        if self.find_best_move(board, limit, stop, multi_pv=multi_pv) is None:
+            return []
+        return self.lines
+
+    def _iterative_deepening(self, position: Position, root_moves: List[int], first_depth: int,
+                             max_depth: int, limit: SearchLimit, start_time: float) -> int:
+        """Search the root to increasing depths until max_depth or the limit is
+        reached, and return the best move of the deepest completed iteration."""
+        key = position.key
+        # A move is always ready, even if the first iteration gets cut short
+        best_move = root_moves[0]
+        line_count = min(self._multi_pv, len(root_moves))
+        previous_scores: List[Optional[int]] = [None] * line_count
+        for depth in range(first_depth, max_depth + 1):
+            lines = []
+            try:
+                # Multi-PV: each line searches the root moves the earlier
+                # lines didn't take, and its best move joins them at the front
+                for index in range(line_count):
+                    rest = root_moves[index:]
+                    move, value = self._aspiration_search(position, rest, depth, previous_scores[index])
+                    rest.remove(move)
+                    root_moves[index:] = [move] + rest
+                    if index == 0:
+                        self.tt.store(key, depth, value, EXACT, move)
+                    # Read the PV before later lines overwrite its entries
+                    lines.append(AnalysisLine(decode_move(move), value, self._pv_from_tt(position, move, depth)))
+            except _SearchAborted:
+                break
+            # A later line can come out ahead of an earlier one when the
+            # search is unstable; rank them by score, stably
+            order = sorted(range(line_count), key=lambda i: -lines[i].score)
+            root_moves[:line_count] = [root_moves[i] for i in order]
+            self.lines = [lines[i] for i in order]
+            previous_scores = [line.score for line in self.lines]
+
+            best_move = root_moves[0]
+            self.best_score = self.lines[0].score
+            self.completed_depth = depth
+            self.principal_variation = self.lines[0].pv
+            if self._info is not None:
+                now = time.monotonic()
+                if now >= self._next_info:
+                    self._report_info(now)
+
+            # A new iteration usually takes longer than all previous ones
+            # together, so don't start one that is unlikely to finish
+            if self._deadline is not None:
+                elapsed = time.monotonic() - start_time
+                if elapsed >= limit.time * 0.5:
+                    break
+            if self._node_limit is not None and self.total_nodes() >= self._node_limit:
+                break
+        return best_move
+
+    def _expected_reply(self, board: chess.Board, move: int) -> Optional[chess.Move]:
+        """The best reply to move stored in the transposition table, if any."""
+        position = Position.from_board(board)
+        position.push(move)
+        entry = self.tt.probe(position.key)
+        if entry and entry[3] and position.is_legal(entry[3]):
+            return decode_move(entry[3])
+        return None
+
+    def _pv_from_tt(self, position: Position, move: int, length: int) -> List[chess.Move]:
+        """The principal variation starting with move, followed through the
+        best moves stored in the transposition table, up to length moves."""
+        pv = [move]
+        seen = {position.key}
+        position.push(move)
+        while len(pv) < length and position.key not in seen:
+            seen.add(position.key)
+            entry = self.tt.probe(position.key)
+            if not entry or not entry[3] or not position.is_legal(entry[3]):
+                break
+            pv.append(entry[3])
+            position.push(entry[3])
+        for _ in pv:
+            position.pop()
+        return [decode_move(code) for code in pv]
+
+    def _report_info(self, now: float):
+        """Send the search's progress to the info callback."""
+        self._next_info = now + INFO_INTERVAL
+        elapsed = now - self._start_time
+        nodes = self.total_nodes() + self.helper_nodes
+        score = self.best_score
+        mate = None
+        if abs(score) >= MATE_BOUND:
+            # Plies to mate, rounded up to moves
+            mate = (MATE_SCORE - abs(score) + 1) // 2
+            if score < 0:
+                mate = -mate
+        self._info({
+            "depth": self.completed_depth,
+            "score": score,
+            "mate": mate,
+            "pv": self.principal_variation,
+            "nodes": nodes,
+            "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+            "hashfull": self.tt.hashfull(),
+            "time": elapsed,
+        })
+
+    def close(self):
+        """Stop the Lazy SMP helper processes, if any were started."""
+        if self._helpers is not None:
+            self._helpers.close()
+            self._helpers = None
+
+    def _aspiration_search(self, position: Position, root_moves: List[int],
+                           depth: int, previous: Optional[int]) -> Tuple[int, int]:
+        """Search the root in a narrow window around the previous iteration's
+        score, widening on failure. Without one the window is full."""
+        if previous is None or abs(previous) >= MATE_BOUND:
+            return self._search_root(position, root_moves, depth, -INFINITE_SCORE, INFINITE_SCORE)
+
+        delta = ASPIRATION_WINDOW
+        alpha = previous - delta
+        beta = previous + delta
+        while True:
+            move, value = self._search_root(position, root_moves, depth, alpha, beta)
+            if value <= alpha:
+                alpha = max(value - delta, -INFINITE_SCORE)
+            elif value >= beta:
+                beta = min(value + delta, INFINITE_SCORE)
+                # The move that failed high is the best candidate for the re-search
+                root_moves.remove(move)
+                root_moves.insert(0, move)
+            else:
+                return move, value
+            delta *= 2
+
+    def _search_root(self, position: Position, root_moves: List[int],
+                     depth: int, alpha: int, beta: int) -> Tuple[int, int]:
+        """Principal variation search over the root moves.
+
+        Returns the best move and its score. The score is only exact when it
+        lies strictly inside (alpha, beta).
+        """
+        best_move = root_moves[0]
+        best_value = -INFINITE_SCORE
+
+        for i, move in enumerate(root_moves):
+            position.push(move)
+            value = self._pvs_child(position, depth, alpha, beta, 1, i == 0)
+            position.pop()
 
             if value > best_value:
                 best_value = value
                 best_move = move
-                alpha = max(alpha, value)
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
 
-        print(f"Nodes evaluated: {self.nodes_evaluated}")
-        return best_move
+        return best_move, best_value
 
-    def _order_moves(self, board: chess.Board, moves: List[chess.Move]) -> List[chess.Move]:
-        """Order moves to improve alpha-beta pruning efficiency."""
-        move_scores = []
-        for move in moves:
-            score = 0
-            # Prioritize captures
-            if board.is_capture(move):
-                score += 10
-                # Prioritize captures of higher value pieces
-                captured_piece = board.piece_at(move.to_square)
-                if captured_piece:
-                    score += captured_piece.piece_type * 2
-            # Prioritize checks by simulating the move on a temporary copy
-            temp_board_for_check = board.copy()
-            temp_board_for_check.push(move)
-            if temp_board_for_check.is_check():
-                score += 5
-            # No pop needed for temp_board_for_check
-            move_scores.append((move, score))
-        
-        # Sort moves by score in descending order
-        move_scores.sort(key=lambda x: x[1], reverse=True)
-        return [move for move, _ in move_scores]
+    def _pvs_child(self, position: Position, depth: int, alpha: int, beta: int,
+                   ply: int, first: bool, reduction: int = 0) -> int:
+        """Search a child node (the move is already pushed) and return its score
+        from the parent's perspective.
+
+        The first move gets the full window. The rest are searched with a null
+        window and re-searched only if they land inside (alpha, beta). A
+        reduced move that beats alpha is first re-searched at full depth.
+        """
+        if first:
+            return -self._negamax(position, depth - 1, -beta, -alpha, ply)
+        if reduction:
+            value = -self._negamax(position, depth - 1 - reduction, -alpha - 1, -alpha, ply)
+            if value <= alpha:
+                return value
+        value = -self._negamax(position, depth - 1, -alpha - 1, -alpha, ply)
+        if alpha < value < beta:
+            value = -self._negamax(position, depth - 1, -beta, -alpha, ply)
+        return value
 
-    def _minimax(self, board: chess.Board, depth: int, alpha: float, beta: float, 
-                 maximizing_player: bool, ai_color: chess.Color) -> float:
-        """Recursive minimax implementation with alpha-beta pruning."""
+    def total_nodes(self) -> int:
+        """Main search plus quiescence nodes of the last search."""
+        return self.nodes_evaluated + self.qnodes_evaluated
+
+    def _check_limits(self):
+        """Abort the search once the time or node budget is spent, or when stopped."""
+        if self._stop is not None and self._stop.is_set():
+            raise _SearchAborted()
+        if self._node_limit is not None and self.total_nodes() >= self._node_limit:
+            raise _SearchAborted()
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            raise _SearchAborted()
+        if self._info is not None and self.principal_variation:
+            now = time.monotonic()
+            if now >= self._next_info:
+                self._report_info(now)
+
+    def _negamax(self, position: Position, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """Negamax principal variation search with alpha-beta pruning.
+
+        Returns the score from the side to move's perspective.
+        """
         self.nodes_evaluated += 1
-        
-        if depth == 0 or board.is_game_over():
-            return evaluate_board(board, ai_color)
-
-        if maximizing_player:
-            max_eval = float('-inf')
-            for move in self._order_moves(board, list(board.legal_moves)):
-                board.push(move)
-                eval = self._minimax(board, depth - 1, alpha, beta, False, ai_color)
-                board.pop()
-                max_eval = max(max_eval, eval)
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-            return max_eval
+        if not self.nodes_evaluated & _LIMIT_CHECK_MASK:
+            self._check_limits()
+
+        # Draws by rule or repetition. Mate and stalemate are found below,
+        # when the node turns out to have no legal moves, except that a mate
+        # on the move that reaches the fifty-move limit still wins.
+        key = position.key
+        if self.check_incremental and (key != position.zobrist_hash()
+                                       or position.pawn_key != position.pawn_hash()):
+            raise AssertionError(f"Incremental Zobrist keys {key:#x}, {position.pawn_key:#x} != "
+                                 f"{position.zobrist_hash():#x}, {position.pawn_hash():#x} "
+                                 f"in {position.to_board().fen()}")
+        self._path_keys[ply] = key
+        if position.halfmove_clock >= 100:
+            if position.is_check():
+                moves = self._ply_moves[ply]
+                moves.clear()
+                position.generate_moves(moves)
+                if not moves:
+                    return -MATE_SCORE + ply
+            return 0
+        if self._is_repetition(key, ply, position.halfmove_clock) or _is_insufficient_material(position):
+            return 0
+        if depth == 0 or ply >= MAX_PLY - 1:
+            return self._quiescence(position, alpha, beta, ply)
+
+        entry = self.tt.probe(key)
+        hash_move = 0
+        if entry:
+            tt_depth, tt_score, tt_bound, hash_move = entry
+            if tt_depth >= depth:
+                tt_score = _score_from_tt(tt_score, ply)
+                if (tt_bound == EXACT
+                        or (tt_bound == LOWER and tt_score >= beta)
+                        or (tt_bound == UPPER and tt_score <= alpha)):
+                    return tt_score
+
+        in_check = position.is_check()
+        pv_node = beta - alpha > 1
+
+        # Frontier nodes far below alpha. Disabled in check and near mate
+        # scores, where the static evaluation means nothing.
+        futile = False
+        if ((self.futility_pruning or self.razoring) and depth < len(FUTILITY_MARGINS)
+                and not pv_node and not in_check and -MATE_BOUND < alpha and beta < MATE_BOUND):
+            static_eval = self._evaluate(position)
+            if self.razoring and static_eval + RAZOR_MARGINS[depth] <= alpha:
+                value = self._quiescence(position, alpha, beta, ply)
+                if depth == 1 or value <= alpha:
+                    return value
+            futile = self.futility_pruning and static_eval + FUTILITY_MARGINS[depth] <= alpha
+
+        # Null-move pruning: if passing still fails high, a real move will too.
+        # Skipped with only pawns left, where zugzwang makes passing unsound.
+        if (self.null_move and not pv_node and not in_check and depth >= NULL_MOVE_MIN_DEPTH
+                and position.last_move
+                and position.occupied_co[position.turn] & ~(position.pawns | position.kings)):
+            position.push(0)
+            value = -self._negamax(position, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1)
+            position.pop()
+            if value >= beta:
+                # Don't trust mate scores found after passing
+                return beta if value >= MATE_BOUND else value
+
+        alpha_orig = alpha
+        best_value = -INFINITE_SCORE
+        best_move = 0
+        can_reduce = self.late_move_reductions and depth >= LMR_MIN_DEPTH and not in_check
+
+        picker = self._pickers[ply]
+        picker.reset(position, hash_move, ply)
+        i = -1
+        while True:
+            move = picker.next_move()
+            if not move:
+                break
+            i += 1
+            quiet = picker.stage == STAGE_QUIETS and picker.score < CHECK_SCORE
+            if futile and i > 0 and quiet:
+                # Quiet moves come best first, so only futile ones remain
+                break
+            # Late move reductions for quiet moves ordered after the hash move,
+            # captures, killers, counter move and checks
+            reduction = 0
+            if can_reduce and i >= LMR_FULL_DEPTH_MOVES and quiet:
+                reduction = 1 if i < 2 * LMR_FULL_DEPTH_MOVES or depth < 6 else 2
+            position.push(move)
+            value = self._pvs_child(position, depth, alpha, beta, ply + 1, i == 0, reduction)
+            position.pop()
+
+            if value > best_value:
+                best_value = value
+                best_move = move
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        if not move >> 12 and not position.is_capture(move):
+                            self.ordering.record_cutoff(position, move, depth, ply)
+                        break
+
+        if not best_move:
+            # No legal moves: checkmate or stalemate. Prefer the shortest mate.
+            return -MATE_SCORE + ply if in_check else 0
+
+        if best_value >= beta:
+            bound = LOWER
+        elif best_value <= alpha_orig:
+            bound = UPPER
         else:
-            min_eval = float('inf')
-            for move in self._order_moves(board, list(board.legal_moves)):
-                board.push(move)
-                eval = self._minimax(board, depth - 1, alpha, beta, True, ai_color)
-                board.pop()
-                min_eval = min(min_eval, eval)
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-            return min_eval 
\ No newline at end of file
+            bound = EXACT
+        self.tt.store(key, depth, _score_to_tt(best_value, ply), bound, best_move)
+        return best_value
+
+    def _evaluate(self, position: Position) -> int:
+        """Static evaluation from the side to move's perspective, the same as
+        evaluate_position but with the material score kept by Position.push,
+        or the network's score with the NNUE backend. Positions reached again,
+        by transposition or in a later search, come from the evaluation cache."""
+        material = position.material
+        if self.check_incremental:
+            if material != material_score(position):
+                raise AssertionError(f"Incremental material score {material} != {material_score(position)} "
+                                     f"in {position.to_board().fen()}")
+            if self.nnue is not None and (position.accumulators() != self.nnue.refresh(position)).any():
+                raise AssertionError(f"Incremental NNUE accumulators differ from a refresh "
+                                     f"in {position.to_board().fen()}")
+        cache = self.eval_cache
+        if cache is not None:
+            score = cache.probe(position.key)
+            if score is not None:
+                return score
+        if self.nnue is not None:
+            score = position.evaluate()
+        else:
+            score = material + mobility_score(position) + self._pawn_structure(position)
+            if position.turn == chess.BLACK:
+                score = -score
+        if cache is not None:
+            cache.store(position.key, score)
+        return score
+
+    def _pawn_structure(self, position: Position) -> int:
+        """pawn_structure_score of the position, from the pawn hash if possible."""
+        pawn_key = position.pawn_key
+        if not pawn_key:
+            return 0  # No pawns
+        pawn_hash = self.pawn_hash
+        if pawn_hash is not None:
+            score = pawn_hash.probe(pawn_key)
+            if score is not None:
+                return score
+        pawns = position.pieces[chess.PAWN]
+        score = pawn_structure_score(pawns & position.occupied_co[chess.WHITE],
+                                     pawns & position.occupied_co[chess.BLACK])
+        if pawn_hash is not None:
+            pawn_hash.store(pawn_key, score)
+        return score
+
+    def _is_repetition(self, key: int, ply: int, halfmove_clock: int) -> bool:
+        """Whether the position occurred before on the search path or in the game.
+
+        Only positions since the last capture or pawn move can repeat, and only
+        every second ply has the same side to move. A single repetition is
+        scored as a draw, since the side that can repeat once can repeat again.
+        """
+        history = self._history_keys
+        distance = 4
+        while distance <= halfmove_clock:
+            back = ply - distance
+            if back >= 0:
+                if self._path_keys[back] == key:
+                    return True
+            elif len(history) + back >= 0:
+                if history[back] == key:
+                    return True
+            else:
+                break
+            distance += 2
+        return False
+
+    def _quiescence(self, position: Position, alpha: int, beta: int, ply: int) -> int:
+        """Search captures and promotions until the position is quiet.
+
+        The side to move may "stand pat" on the static evaluation instead of
+        capturing, except when in check, where every evasion is searched.
+        Captures that lose material by static exchange evaluation are skipped.
+        """
+        self.qnodes_evaluated += 1
+        if not self.qnodes_evaluated & _LIMIT_CHECK_MASK:
+            self._check_limits()
+
+        if ply >= MAX_PLY:
+            return self._evaluate(position)
+
+        moves = self._ply_moves[ply]
+        scores = self._ply_scores[ply]
+        moves.clear()
+        in_check = position.is_check()
+        if in_check:
+            position.generate_moves(moves)
+            if not moves:
+                return -MATE_SCORE + ply
+            best_value = -INFINITE_SCORE
+        else:
+            stand_pat = self._evaluate(position)
+            if stand_pat >= beta:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            best_value = stand_pat
+            # Captures and promotions, which change the material balance too
+            position.generate_captures(moves)
+        self.ordering.score_captures(position, moves, scores)
+
+        for i in range(len(moves)):
+            pick_next(moves, scores, i)
+            if scores[i] < 0 and not in_check:
+                # Only captures that lose material are left
+                break
+            move = moves[i]
+            position.push(move)
+            value = -self._quiescence(position, -beta, -alpha, ply + 1)
+            position.pop()
+
+            if value > best_value:
+                best_value = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        return best_value
+
+
+class _HelperPool:
+    """Lazy SMP helper processes, started once and reused for every search.
+
+    Each helper has its own MinimaxAI on the shared transposition table and
+    waits for jobs on its own queue. Results come back on one queue, tagged
+    with the search they belong to.
+    """
+
+    def __init__(self, count: int, tt: TranspositionTable, settings: dict):
+        # Spawned, not forked: the GUI calls the search from a thread
+        context = multiprocessing.get_context("spawn")
+        self.stop = context.Event()
+        self.results = context.Queue()
+        self.jobs = [context.Queue() for _ in range(count)]
+        self.processes = [context.Process(target=_helper_main, daemon=True,
+                                          args=(helper_id, tt, settings, jobs, self.results, self.stop))
+                          for helper_id, jobs in enumerate(self.jobs, 1)]
+        for process in self.processes:
+            process.start()
+        self.search_id = 0
+
+    def start(self, board: chess.Board, limit: SearchLimit, generation: int):
+        """Start every helper on a search of board."""
+        self.search_id += 1
+        self.stop.clear()
+        for jobs in self.jobs:
+            jobs.put((self.search_id, board, limit, generation))
+
+    def finish(self) -> List[Tuple[int, int, int, int]]:
+        """Stop the helpers and return their (move, completed depth, score, nodes)."""
+        self.stop.set()
+        results = []
+        while len(results) < len(self.jobs):
+            try:
+                search_id, *result = self.results.get(timeout=HELPER_POLL_INTERVAL)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self.processes):
+                    raise RuntimeError("A Lazy SMP helper process exited during the search")
+                continue
+            if search_id == self.search_id:
+                results.append(result)
+        return results
+
+    def close(self):
+        for jobs in self.jobs:
+            jobs.put(None)
+        for process in self.processes:
+            process.join(HELPER_POLL_INTERVAL)
+            if process.is_alive():
+                process.terminate()
+
+
+def _helper_main(helper_id: int, tt: TranspositionTable, settings: dict, jobs, results, stop):
+    """Entry point of a Lazy SMP helper process: search each job until the
+    main search finishes, then report the deepest completed iteration."""
+    ai = MinimaxAI(tt_size_mb=0, **settings)
+    ai.tt = tt
+    ai._helper_id = helper_id
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        search_id, board, limit, generation = job
+        tt.generation = generation
+        move = None
+        try:
+            move = ai.find_best_move(board, limit, stop)
+        finally:
+            results.put((search_id, encode_move(move), ai.completed_depth, ai.best_score, ai.total_nodes()))
+
+
+def _game_history_keys(board: chess.Board) -> List[int]:
+    """Zobrist keys of the game positions before the current one, oldest first,
+    back to the last capture or pawn move."""
+    keys = []
+    replay = board.copy()
+    for _ in range(min(board.halfmove_clock, len(board.move_stack))):
+        replay.pop()
+        keys.append(chess.polyglot.zobrist_hash(replay))
+    keys.reverse()
+    return keys
+
+
+def _is_insufficient_material(position: Position) -> bool:
+    """Bare kings, or kings and a single minor piece: neither side can mate."""
+    pieces = position.pieces
+    return (not (pieces[chess.PAWN] | pieces[chess.ROOK] | pieces[chess.QUEEN])
+            and chess.popcount(position.occupied) <= 3)
+
+
+def _score_to_tt(score: int, ply: int) -> int:
+    """Make mate scores relative to the stored node instead of the root."""
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score: int, ply: int) -> int:
+    """Convert a stored mate score back to a distance from the root."""
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
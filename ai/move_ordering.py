@@ -0,0 +1,432 @@
+import chess
+from typing import List
+from game.move_generator import PIECE_VALUES
+from ai.position import Position
+
+# Deepest ply that keeps killer moves
+MAX_PLY = 128
+
+# Ordering score bands, highest first
+HASH_MOVE_SCORE = 10000000
+CAPTURE_SCORE = 1000000  # Captures that don't lose material
+KILLER_SCORES = (900000, 800000)
+# Captures that lose material according to the static exchange evaluation
+LOSING_CAPTURE_SCORE = 710000
+COUNTER_MOVE_SCORE = 700000
+CHECK_SCORE = 600000
+# History scores stay below the bands above
+HISTORY_MAX = 500000
+
+# Exchanges that lose less than this (half a pawn) still count as equal
+SEE_TOLERANCE = PIECE_VALUES[chess.PAWN] // 2
+
+# Move picker stages, in the order moves are tried
+STAGE_HASH_MOVE = 0
+STAGE_GENERATE_CAPTURES = 1
+STAGE_GOOD_CAPTURES = 2
+STAGE_KILLERS = 3
+STAGE_GENERATE_QUIETS = 4
+STAGE_QUIETS = 5
+STAGE_BAD_CAPTURES = 6
+STAGE_DONE = 7
+
+
+def gives_check(position: Position, move: int) -> bool:
+    """Test whether a legal move checks the opponent without making it.
+
+    Direct and discovered checks are found from attack masks. Castling, en
+    passant and promotions are rare enough to fall back to push/pop.
+    """
+    from_square = move & 63
+    to_square = (move >> 6) & 63
+    piece_type = position.squares[from_square]
+    if (move >> 12 or (piece_type == chess.PAWN and to_square == position.ep_square)
+            or (piece_type == chess.KING and abs(to_square - from_square) == 2)):
+        position.push(move)
+        check = position.is_check()
+        position.pop()
+        return check
+
+    pieces = position.pieces
+    us = position.turn
+    king = (pieces[chess.KING] & position.occupied_co[not us]).bit_length() - 1
+    from_bb = chess.BB_SQUARES[from_square]
+    king_bb = chess.BB_SQUARES[king]
+    occupied = (position.occupied & ~from_bb) | chess.BB_SQUARES[to_square]
+
+    # Direct check by the moved piece
+    if piece_type == chess.PAWN:
+        if chess.BB_PAWN_ATTACKS[us][to_square] & king_bb:
+            return True
+    elif piece_type == chess.KNIGHT:
+        if chess.BB_KNIGHT_ATTACKS[to_square] & king_bb:
+            return True
+    elif piece_type != chess.KING:
+        if piece_type != chess.ROOK and (
+                chess.BB_DIAG_ATTACKS[to_square][chess.BB_DIAG_MASKS[to_square] & occupied] & king_bb):
+            return True
+        if piece_type != chess.BISHOP and (
+                (chess.BB_RANK_ATTACKS[to_square][chess.BB_RANK_MASKS[to_square] & occupied]
+                 | chess.BB_FILE_ATTACKS[to_square][chess.BB_FILE_MASKS[to_square] & occupied]) & king_bb):
+            return True
+
+    # Discovered check by a slider behind the vacated square
+    if not chess.BB_RAYS[king][from_square]:
+        return False
+    ours = position.occupied_co[us] & ~from_bb
+    diagonal = (pieces[chess.BISHOP] | pieces[chess.QUEEN]) & ours
+    if diagonal and chess.BB_DIAG_ATTACKS[king][chess.BB_DIAG_MASKS[king] & occupied] & diagonal:
+        return True
+    straight = (pieces[chess.ROOK] | pieces[chess.QUEEN]) & ours
+    return bool(straight and (chess.BB_RANK_ATTACKS[king][chess.BB_RANK_MASKS[king] & occupied]
+                              | chess.BB_FILE_ATTACKS[king][chess.BB_FILE_MASKS[king] & occupied]) & straight)
+
+
+def pick_next(moves: List[int], scores: List[int], start: int):
+    """Swap the best scored move at or after start into position start.
+
+    Selecting one move at a time avoids sorting (and allocating) the whole
+    list at nodes that cut off after the first few moves.
+    """
+    best = start
+    best_score = scores[start]
+    for i in range(start + 1, len(moves)):
+        if scores[i] > best_score:
+            best = i
+            best_score = scores[i]
+    if best != start:
+        moves[start], moves[best] = moves[best], moves[start]
+        scores[start], scores[best] = scores[best], scores[start]
+
+
+def _attackers(position: Position, square: int, occupied: int) -> int:
+    """Pieces of both colors attacking square, given the occupancy (for x-rays)."""
+    pieces = position.pieces
+    pawns = pieces[chess.PAWN]
+    return ((chess.BB_KNIGHT_ATTACKS[square] & pieces[chess.KNIGHT])
+            | (chess.BB_KING_ATTACKS[square] & pieces[chess.KING])
+            | (chess.BB_PAWN_ATTACKS[chess.WHITE][square] & pawns & position.occupied_co[chess.BLACK])
+            | (chess.BB_PAWN_ATTACKS[chess.BLACK][square] & pawns & position.occupied_co[chess.WHITE])
+            | ((chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied]
+                | chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied])
+               & (pieces[chess.ROOK] | pieces[chess.QUEEN]))
+            | (chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
+               & (pieces[chess.BISHOP] | pieces[chess.QUEEN]))) & occupied
+
+
+def see(position: Position, move: int) -> int:
+    """Static exchange evaluation: the material the side to move wins (or loses,
+    if negative) in the capture sequence started by move on its target square.
+
+    Both sides recapture with their least valuable attacker and may stop when
+    continuing would lose material. Pieces uncovered behind an attacker (x-rays)
+    join in. Pins and checks are ignored.
+    """
+    from_square = move & 63
+    to_square = (move >> 6) & 63
+    promotion = move >> 12
+    squares = position.squares
+    occupied = position.occupied & ~chess.BB_SQUARES[from_square]
+    victim = squares[to_square]
+    if victim:
+        gain = [PIECE_VALUES[victim]]
+    elif to_square == position.ep_square and squares[from_square] == chess.PAWN:
+        gain = [PIECE_VALUES[chess.PAWN]]
+        occupied &= ~chess.BB_SQUARES[to_square - 8 if position.turn else to_square + 8]
+    else:
+        gain = [0]
+    if promotion:
+        gain[0] += PIECE_VALUES[promotion] - PIECE_VALUES[chess.PAWN]
+        on_square = PIECE_VALUES[promotion]
+    else:
+        on_square = PIECE_VALUES[squares[from_square]]
+
+    pieces = position.pieces
+    side = not position.turn
+    attackers = _attackers(position, to_square, occupied)
+    while True:
+        side_attackers = attackers & position.occupied_co[side]
+        if not side_attackers:
+            break
+        for piece_type in chess.PIECE_TYPES:
+            candidates = side_attackers & pieces[piece_type]
+            if candidates:
+                break
+        if piece_type == chess.KING and attackers & position.occupied_co[not side]:
+            # The king can't recapture on a defended square
+            break
+        gain.append(on_square - gain[-1])
+        on_square = PIECE_VALUES[piece_type]
+        occupied &= ~(candidates & -candidates)
+        attackers = _attackers(position, to_square, occupied)
+        side = not side
+
+    # Either side may decline to continue the exchange
+    for i in range(len(gain) - 1, 0, -1):
+        gain[i - 1] = -max(-gain[i - 1], gain[i])
+    return gain[0]
+
+
+def is_losing_capture(position: Position, move: int) -> bool:
+    """Capture (or promotion) that loses material by static exchange evaluation.
+
+    Exchanges within SEE_TOLERANCE, like bishop for knight, count as equal.
+    """
+    if move >> 12:
+        return see(position, move) < -SEE_TOLERANCE
+    victim = position.squares[(move >> 6) & 63] or chess.PAWN
+    # Taking a piece worth about as much or more can't lose material, skip the SEE
+    if PIECE_VALUES[position.squares[move & 63]] - SEE_TOLERANCE <= PIECE_VALUES[victim]:
+        return False
+    return see(position, move) < -SEE_TOLERANCE
+
+
+def mvv_lva(position: Position, move: int) -> int:
+    """Most valuable victim / least valuable attacker score for a capture or promotion."""
+    squares = position.squares
+    to_square = (move >> 6) & 63
+    victim = squares[to_square]
+    if victim:
+        score = PIECE_VALUES[victim] * 8
+    else:
+        score = PIECE_VALUES[chess.PAWN] * 8 if position.is_en_passant(move) else 0
+    score -= PIECE_VALUES[squares[move & 63]] // 100
+    if move >> 12:
+        score += PIECE_VALUES[move >> 12]
+    return score
+
+
+class MoveOrderer:
+    """Move ordering heuristics that learn from beta cutoffs.
+
+    killers       -- two quiet moves per ply that recently caused a cutoff
+    history       -- butterfly table [color][move & 4095] (from and to squares) of cutoff counts
+    counter_moves -- the quiet move that refuted each previous move, by its from and to squares
+
+    The tables live for the whole search and are aged, not cleared, between moves.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Forget everything, e.g. for a new game."""
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [[0] * 4096, [0] * 4096]
+        self.counter_moves = [0] * 4096
+
+    def age(self):
+        """Prepare for the next search: drop killers and decay history."""
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+        self.history = [[value >> 2 for value in table] for table in self.history]
+
+    def record_cutoff(self, position: Position, move: int, depth: int, ply: int):
+        """Remember a quiet move that caused a beta cutoff at this node."""
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+        table = self.history[position.turn]
+        index = move & 4095
+        table[index] += depth * depth
+        if table[index] > HISTORY_MAX:
+            # Keep the relative order but stay inside the history band
+            self.history = [[value >> 1 for value in t] for t in self.history]
+
+        if position.last_move:
+            self.counter_moves[position.last_move & 4095] = move
+
+    def score_moves(self, position: Position, moves: List[int], scores: List[int],
+                    hash_move: int = 0, ply: int = 0):
+        """Fill scores (reused by the caller) with ordering scores for moves: hash
+        move, winning and equal captures by MVV-LVA, killers, losing captures,
+        counter move, checks, then the remaining quiet moves by history."""
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        counter_move = self.counter_moves[position.last_move & 4095] if position.last_move else 0
+        history = self.history[position.turn]
+
+        scores.clear()
+        for move in moves:
+            if move == hash_move:
+                score = HASH_MOVE_SCORE
+            elif move >> 12 or position.is_capture(move):
+                if is_losing_capture(position, move):
+                    score = LOSING_CAPTURE_SCORE + mvv_lva(position, move)
+                else:
+                    score = CAPTURE_SCORE + mvv_lva(position, move)
+            elif move == killers[0]:
+                score = KILLER_SCORES[0]
+            elif move == killers[1]:
+                score = KILLER_SCORES[1]
+            elif move == counter_move:
+                score = COUNTER_MOVE_SCORE
+            elif gives_check(position, move):
+                score = CHECK_SCORE
+            else:
+                score = history[move & 4095]
+            scores.append(score)
+
+    def score_captures(self, position: Position, moves: List[int], scores: List[int]):
+        """Fill scores with MVV-LVA values for the quiescence search. Losing
+        captures are scored negative so the search can stop at the first one."""
+        scores.clear()
+        for move in moves:
+            if (move >> 12 or position.is_capture(move)) and is_losing_capture(position, move):
+                scores.append(mvv_lva(position, move) - CAPTURE_SCORE)
+            else:
+                scores.append(mvv_lva(position, move))
+
+    def order_moves(self, position: Position, moves: List[int],
+                    hash_move: int = 0, ply: int = 0) -> List[int]:
+        """Return moves sorted best first. Used once per search for the root moves."""
+        scores = []
+        self.score_moves(position, moves, scores, hash_move, ply)
+        order = sorted(range(len(moves)), key=scores.__getitem__, reverse=True)
+        return [moves[i] for i in order]
+
+
+class MovePicker:
+    """Staged, lazy legal move generation for one node of the main search.
+
+    Moves are handed out one at a time: the hash move, winning and equal
+    captures (MVV-LVA), killers and the counter move, quiet moves by history,
+    then losing captures. Each stage is only generated once the previous ones
+    failed to cut off, so most cut nodes never generate quiet moves at all.
+
+    One picker is kept per ply and reset at each node, so its lists are reused.
+    After next_move(), stage and score describe the move just returned.
+    """
+
+    def __init__(self, orderer: MoveOrderer):
+        self.orderer = orderer
+        self.moves: List[int] = []
+        self.scores: List[int] = []
+        self.bad_captures: List[int] = []
+        self.refutations: List[int] = []
+        self.position = None
+        self.hash_move = 0
+        self.ply = 0
+        self.index = 0
+        self.stage = STAGE_DONE
+        self.score = 0
+
+    def reset(self, position: Position, hash_move: int, ply: int):
+        """Start picking moves for a new node."""
+        self.position = position
+        self.hash_move = hash_move if hash_move and position.is_legal(hash_move) else 0
+        self.ply = ply
+        self.stage = STAGE_HASH_MOVE
+
+    def next_move(self) -> int:
+        """Return the next move to search, or 0 when all moves were returned."""
+        position = self.position
+        while True:
+            stage = self.stage
+            if stage == STAGE_HASH_MOVE:
+                self.stage = STAGE_GENERATE_CAPTURES
+                if self.hash_move:
+                    self.score = HASH_MOVE_SCORE
+                    return self.hash_move
+
+            elif stage == STAGE_GENERATE_CAPTURES:
+                moves = self.moves
+                moves.clear()
+                # Quiet promotions are ordered with the captures
+                position.generate_captures(moves)
+                if self.hash_move in moves:
+                    moves.remove(self.hash_move)
+                scores = self.scores
+                scores.clear()
+                for move in moves:
+                    scores.append(mvv_lva(position, move))
+                self.bad_captures.clear()
+                self.index = 0
+                self.stage = STAGE_GOOD_CAPTURES
+
+            elif stage == STAGE_GOOD_CAPTURES:
+                moves = self.moves
+                while self.index < len(moves):
+                    pick_next(moves, self.scores, self.index)
+                    move = moves[self.index]
+                    self.index += 1
+                    # The exchange is only evaluated once the capture is up next.
+                    # Checking captures are kept: SEE can't see what the check wins.
+                    if is_losing_capture(position, move) and not gives_check(position, move):
+                        self.bad_captures.append(move)
+                        continue
+                    self.score = CAPTURE_SCORE + self.scores[self.index - 1]
+                    return move
+                self._collect_refutations()
+                self.index = 0
+                self.stage = STAGE_KILLERS
+
+            elif stage == STAGE_KILLERS:
+                if self.index < len(self.refutations):
+                    move = self.refutations[self.index]
+                    self.score = (KILLER_SCORES[self.index] if self.index < len(KILLER_SCORES)
+                                  else COUNTER_MOVE_SCORE)
+                    self.index += 1
+                    return move
+                self.stage = STAGE_GENERATE_QUIETS
+
+            elif stage == STAGE_GENERATE_QUIETS:
+                history = self.orderer.history[position.turn]
+                hash_move = self.hash_move
+                refutations = self.refutations
+                moves = self.moves
+                scores = self.scores
+                moves.clear()
+                scores.clear()
+                position.generate_quiets(moves)
+                i = 0
+                while i < len(moves):
+                    move = moves[i]
+                    if move == hash_move or move in refutations:
+                        moves[i] = moves[-1]
+                        moves.pop()
+                        continue
+                    if gives_check(position, move):
+                        scores.append(CHECK_SCORE)
+                    else:
+                        scores.append(history[move & 4095])
+                    i += 1
+                self.index = 0
+                self.stage = STAGE_QUIETS
+
+            elif stage == STAGE_QUIETS:
+                moves = self.moves
+                if self.index < len(moves):
+                    pick_next(moves, self.scores, self.index)
+                    self.score = self.scores[self.index]
+                    self.index += 1
+                    return moves[self.index - 1]
+                self.index = 0
+                self.stage = STAGE_BAD_CAPTURES
+
+            elif stage == STAGE_BAD_CAPTURES:
+                if self.index < len(self.bad_captures):
+                    self.score = LOSING_CAPTURE_SCORE
+                    self.index += 1
+                    return self.bad_captures[self.index - 1]
+                self.stage = STAGE_DONE
+
+            else:
+                return 0
+
+    def _collect_refutations(self):
+        """Gather the legal, quiet killers and counter move not already tried."""
+        self.refutations.clear()
+        if self.ply < MAX_PLY:
+            for move in self.orderer.killers[self.ply]:
+                self._add_refutation(move)
+        last_move = self.position.last_move
+        if last_move:
+            self._add_refutation(self.orderer.counter_moves[last_move & 4095])
+
+    def _add_refutation(self, move: int):
+        position = self.position
+        if (move and move != self.hash_move and move not in self.refutations and not move >> 12
+                and not position.is_capture(move) and position.is_legal(move)):
+            self.refutations.append(move)
@@ -0,0 +1,226 @@
+import chess
+import numpy as np
+from typing import Union
+
+from ai.position import Position
+
+# An NNUE-style evaluator: a feature transformer from 768 piece-square
+# features to two accumulators of HIDDEN_SIZE values, one from each side's
+# point of view, followed by two small dense layers.
+#
+# A feature is one (color, piece type, square) relative to the perspective:
+# "our" pieces are the first 384 features and the board is flipped vertically
+# for Black, so the same weights serve both sides. A move changes at most four
+# features, so the accumulators are updated with a few row additions on make
+# and unmake; only the small layers after them are evaluated at each leaf.
+
+FEATURES = 768
+DEFAULT_HIDDEN_SIZE = 128
+DEFAULT_L1_SIZE = 32
+
+# Accumulator values are clipped to [0, QA] before the dense layers
+QA = 255
+
+# Centipawns per unit of network output
+OUTPUT_SCALE = 400
+
+# Scores are clamped well below MATE_BOUND so they are never taken for mates
+MAX_SCORE = 9000
+
+# Plies of accumulators preallocated; the stack grows if a line goes deeper
+_STACK_PLIES = 256
+
+# Arrays in a weight file, with their dtypes. Shapes follow from ft_weights
+# (FEATURES x hidden) and l1_weights (2 * hidden x l1).
+_WEIGHT_ARRAYS = {
+    "ft_weights": np.int16,
+    "ft_bias": np.int16,
+    "l1_weights": np.float32,
+    "l1_bias": np.float32,
+    "out_weights": np.float32,
+    "out_bias": np.float32,
+}
+
+
+def feature_index(perspective: chess.Color, color: chess.Color, piece_type: int, square: int) -> int:
+    """Index of a piece's feature in the accumulator of `perspective`."""
+    if perspective == chess.BLACK:
+        square ^= 56
+    return (0 if color == perspective else 384) + (piece_type - 1) * 64 + square
+
+
+class Network:
+    """Weights of an NNUE-style network.
+
+    The feature transformer weights are int16, so the accumulators are sums
+    of small integers: they are kept in float32, which adds them exactly, and
+    incremental updates give bit-for-bit the same result as a refresh.
+    """
+
+    def __init__(self, ft_weights: np.ndarray, ft_bias: np.ndarray, l1_weights: np.ndarray,
+                 l1_bias: np.ndarray, out_weights: np.ndarray, out_bias: np.ndarray):
+        hidden = ft_weights.shape[1] if ft_weights.ndim == 2 else 0
+        l1 = l1_weights.shape[1] if l1_weights.ndim == 2 else 0
+        expected = {
+            "ft_weights": (FEATURES, hidden),
+            "ft_bias": (hidden,),
+            "l1_weights": (2 * hidden, l1),
+            "l1_bias": (l1,),
+            "out_weights": (l1,),
+            "out_bias": (),
+        }
+        arrays = {"ft_weights": ft_weights, "ft_bias": ft_bias, "l1_weights": l1_weights,
+                  "l1_bias": l1_bias, "out_weights": out_weights, "out_bias": out_bias}
+        for name, array in arrays.items():
+            if not hidden or not l1 or array.shape != expected[name]:
+                raise ValueError(f"{name} has shape {array.shape}, expected {expected[name]}")
+        self.hidden_size = hidden
+        self.l1_size = l1
+        self.ft_weights = ft_weights.astype(np.int16)
+        self.ft_bias = ft_bias.astype(np.int16)
+        self.l1_weights = l1_weights.astype(np.float32)
+        self.l1_bias = l1_bias.astype(np.float32)
+        self.out_weights = out_weights.astype(np.float32)
+        self.out_bias = float(out_bias)
+
+        # Dense layer weights pre-divided by QA, indexed by the side to move.
+        # They take the accumulators flattened in perspective order (Black,
+        # White), while l1_weights takes the side to move's accumulator first.
+        l1_weights = self.l1_weights / np.float32(QA)
+        self._l1_by_turn = [l1_weights, np.concatenate((l1_weights[hidden:], l1_weights[:hidden]))]
+        # Both perspectives' feature rows per piece, as one (2, hidden) array
+        # indexed [color][piece_type][square], ready to add to an accumulator
+        ft = self.ft_weights.astype(np.float32)
+        self.feature_rows = [[None] + [[np.stack([ft[feature_index(perspective, color, piece_type, square)]
+                                                  for perspective in (chess.BLACK, chess.WHITE)])
+                                        for square in chess.SQUARES]
+                                       for piece_type in chess.PIECE_TYPES]
+                             for color in (chess.BLACK, chess.WHITE)]
+
+    def refresh(self, board: Union[chess.Board, Position]) -> np.ndarray:
+        """Accumulators of a position computed from scratch, as a (2, hidden)
+        array indexed by perspective. Index it with int(color): NumPy takes a
+        bool index as a mask."""
+        accumulators = np.empty((2, self.hidden_size), dtype=np.float32)
+        pieces = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+        for perspective in (chess.BLACK, chess.WHITE):
+            features = [feature_index(perspective, color, piece_type, square)
+                        for color in (chess.BLACK, chess.WHITE)
+                        for piece_type, mask in zip(chess.PIECE_TYPES, pieces)
+                        for square in chess.scan_forward(mask & board.occupied_co[color])]
+            accumulators[int(perspective)] = (self.ft_bias.astype(np.float32)
+                                              + self.ft_weights[features].astype(np.float32).sum(axis=0))
+        return accumulators
+
+    def forward(self, accumulators: np.ndarray, turn: chess.Color) -> int:
+        """Score in centipawns, for the side to move, from the (2, hidden)
+        accumulators. Called at every leaf, so it sticks to plain ufuncs,
+        in place where possible (np.clip is several times slower)."""
+        hidden = np.minimum(np.maximum(accumulators, 0), QA).reshape(-1) @ self._l1_by_turn[turn]
+        hidden += self.l1_bias
+        np.maximum(hidden, 0, out=hidden)
+        np.minimum(hidden, 1, out=hidden)
+        score = int((hidden @ self.out_weights + self.out_bias) * OUTPUT_SCALE)
+        return max(-MAX_SCORE, min(MAX_SCORE, score))
+
+    def evaluate(self, board: Union[chess.Board, Position]) -> int:
+        """Reference evaluation from the side to move's perspective, with the
+        accumulators refreshed from scratch. Slow; used to check the
+        incremental updates of NNUEPosition."""
+        return self.forward(self.refresh(board), board.turn)
+
+
+def load_network(path: str) -> Network:
+    """Load a network from a .npz file holding the arrays named in _WEIGHT_ARRAYS."""
+    with np.load(path) as data:
+        missing = [name for name in _WEIGHT_ARRAYS if name not in data]
+        if missing:
+            raise ValueError(f"{path} is missing {', '.join(missing)}")
+        return Network(**{name: data[name] for name in _WEIGHT_ARRAYS})
+
+
+def save_network(network: Network, path: str):
+    """Save a network in the format load_network reads."""
+    np.savez(path, **{name: np.asarray(getattr(network, name), dtype=dtype)
+                      for name, dtype in _WEIGHT_ARRAYS.items()})
+
+
+def random_network(hidden_size: int = DEFAULT_HIDDEN_SIZE, l1_size: int = DEFAULT_L1_SIZE,
+                   seed: int = 0) -> Network:
+    """Network with random weights of realistic magnitude, for benchmarks and
+    correctness checks. It does not play well."""
+    rng = np.random.default_rng(seed)
+    return Network(
+        ft_weights=rng.integers(-64, 65, size=(FEATURES, hidden_size)),
+        ft_bias=rng.integers(0, 128, size=hidden_size),
+        l1_weights=rng.normal(0, 1 / np.sqrt(2 * hidden_size), size=(2 * hidden_size, l1_size)),
+        l1_bias=np.zeros(l1_size),
+        out_weights=rng.normal(0, 1 / np.sqrt(l1_size), size=l1_size),
+        out_bias=np.zeros(()),
+    )
+
+
+class NNUEPosition(Position):
+    """Position that keeps the network's accumulators up to date in push and
+    pop. Accumulators are kept per ply on a preallocated stack, so pop only
+    steps back to the previous ply."""
+
+    __slots__ = ("network", "_accumulators", "_ply")
+
+    @classmethod
+    def from_board(cls, board: chess.Board, network: Network) -> "NNUEPosition":
+        position = super().from_board(board)
+        position.network = network
+        position._accumulators = np.empty((_STACK_PLIES, 2, network.hidden_size), dtype=np.float32)
+        position._accumulators[0] = network.refresh(position)
+        position._ply = 0
+        return position
+
+    def evaluate(self) -> int:
+        """Network score from the side to move's perspective."""
+        return self.network.forward(self._accumulators[self._ply], self.turn)
+
+    def accumulators(self) -> np.ndarray:
+        """The current (2, hidden) accumulators, indexed by perspective."""
+        return self._accumulators[self._ply]
+
+    def push(self, move: int):
+        """Make a move, updating the accumulators by the features it changes."""
+        ply = self._ply + 1
+        stack = self._accumulators
+        if ply == len(stack):
+            stack = self._accumulators = np.concatenate((stack, np.empty_like(stack)))
+        accumulators = stack[ply]
+        self._ply = ply
+        if not move:
+            accumulators[:] = stack[ply - 1]
+            Position.push(self, move)
+            return
+
+        rows = self.network.feature_rows
+        us = self.turn
+        ours = rows[us]
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        piece_type = self.squares[from_square]
+        captured = self.squares[to_square]
+        np.subtract(stack[ply - 1], ours[piece_type][from_square], out=accumulators)
+        accumulators += ours[move >> 12 or piece_type][to_square]
+        if captured:
+            accumulators -= rows[not us][captured][to_square]
+        elif piece_type == chess.PAWN and (to_square - from_square) & 7:
+            # En passant
+            accumulators -= rows[not us][chess.PAWN][to_square - 8 if us == chess.WHITE else to_square + 8]
+        elif piece_type == chess.KING and (to_square - from_square == 2 or from_square - to_square == 2):
+            if to_square > from_square:
+                rook_from, rook_to = to_square + 1, to_square - 1
+            else:
+                rook_from, rook_to = to_square - 2, to_square + 1
+            accumulators -= ours[chess.ROOK][rook_from]
+            accumulators += ours[chess.ROOK][rook_to]
+        Position.push(self, move)
+
+    def pop(self):
+        """Unmake the last move made with push."""
+        Position.pop(self)
+        self._ply -= 1
@@ -0,0 +1,670 @@
+import chess
+import chess.polyglot
+from typing import List, Optional
+
+from ai.transposition import encode_move
+from game.move_generator import PIECE_SQUARE_SCORES, material_score
+
+# Moves are plain ints in the transposition table encoding:
+#   from (6 bits) | to (6 bits) << 6 | promotion piece type << 12
+# Castling is the king's two-square move and 0 is the null move.
+
+# Promotion pieces, strongest first
+_PROMOTIONS = (chess.QUEEN, chess.KNIGHT, chess.ROOK, chess.BISHOP)
+
+# Attack tables, bound once at import for the hot loops below
+_BB_SQUARES = chess.BB_SQUARES
+_BB_KNIGHT_ATTACKS = chess.BB_KNIGHT_ATTACKS
+_BB_KING_ATTACKS = chess.BB_KING_ATTACKS
+_BB_PAWN_ATTACKS = chess.BB_PAWN_ATTACKS
+_BB_DIAG_ATTACKS = chess.BB_DIAG_ATTACKS
+_BB_DIAG_MASKS = chess.BB_DIAG_MASKS
+_BB_RANK_ATTACKS = chess.BB_RANK_ATTACKS
+_BB_RANK_MASKS = chess.BB_RANK_MASKS
+_BB_FILE_ATTACKS = chess.BB_FILE_ATTACKS
+_BB_FILE_MASKS = chess.BB_FILE_MASKS
+_BB_RAYS = chess.BB_RAYS
+_BB_BETWEEN = [[chess.between(a, b) for b in chess.SQUARES] for a in chess.SQUARES]
+_BB_ALL = chess.BB_ALL
+_BB_BACK_RANKS = chess.BB_RANK_1 | chess.BB_RANK_8
+
+# Polyglot Zobrist keys, indexed [color][piece_type][square] for pieces
+_ZOBRIST = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+_PIECE_KEYS = [[None] + [[_ZOBRIST[64 * ((piece_type - 1) * 2 + color) + square] for square in chess.SQUARES]
+                         for piece_type in chess.PIECE_TYPES]
+               for color in (chess.BLACK, chess.WHITE)]
+_CASTLING_KEYS = ((chess.BB_H1, _ZOBRIST[768]), (chess.BB_A1, _ZOBRIST[769]),
+                  (chess.BB_H8, _ZOBRIST[770]), (chess.BB_A8, _ZOBRIST[771]))
+_EP_KEYS = _ZOBRIST[772:780]
+_TURN_KEY = _ZOBRIST[780]
+
+
+class Position:
+    """Compact chess position used inside the search.
+
+    Only what the search needs is kept: one bitboard per piece type, one per
+    color, a 64-square piece type array, and an undo stack of plain tuples.
+    Moves are ints (see above), so making and unmaking a move allocates one
+    tuple instead of chess.Move and board state objects.
+
+    Positions are converted from and to chess.Board at the search boundary.
+    Only standard chess castling is supported.
+
+    The attribute names (pawns, occupied_co, turn, ...) follow chess.Board, so
+    the evaluation functions in game.move_generator accept either.
+    """
+
+    __slots__ = ("pieces", "occupied_co", "occupied", "squares", "turn", "castling_rights",
+                 "ep_square", "halfmove_clock", "fullmove_number", "material", "key", "pawn_key",
+                 "last_move",
+                 "_stack")
+
+    def __init__(self):
+        self.pieces = [0] * 7  # Bitboard per piece type, both colors (index 0 unused)
+        self.occupied_co = [0, 0]  # Bitboard per color, indexed like chess.Board
+        self.occupied = 0
+        self.squares = [0] * 64  # Piece type on each square, 0 if empty
+        self.turn = chess.WHITE
+        self.castling_rights = 0  # Rook squares that can still castle
+        # Only set when a pawn of the side to move could capture en passant,
+        # like the polyglot hash
+        self.ep_square: Optional[int] = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.material = 0  # material_score, kept up to date by push and pop
+        self.key = 0  # zobrist_hash, kept up to date by push and pop
+        self.pawn_key = 0  # pawn_hash, kept up to date by push and pop
+        self.last_move = 0
+        self._stack: List[tuple] = []
+
+    @classmethod
+    def from_board(cls, board: chess.Board) -> "Position":
+        """Convert a chess.Board. Its move stack is not copied."""
+        if board.chess960:
+            raise ValueError("Chess960 castling is not supported")
+        position = cls()
+        for piece_type in chess.PIECE_TYPES:
+            mask = board.pieces_mask(piece_type, chess.WHITE) | board.pieces_mask(piece_type, chess.BLACK)
+            position.pieces[piece_type] = mask
+            for square in chess.scan_forward(mask):
+                position.squares[square] = piece_type
+        position.occupied_co = [board.occupied_co[chess.BLACK], board.occupied_co[chess.WHITE]]
+        position.occupied = board.occupied
+        position.turn = board.turn
+        position.castling_rights = board.clean_castling_rights()
+        ep_square = board.ep_square
+        if ep_square is not None and (_BB_PAWN_ATTACKS[not board.turn][ep_square]
+                                      & board.pawns & board.occupied_co[board.turn]):
+            position.ep_square = ep_square
+        position.halfmove_clock = board.halfmove_clock
+        position.fullmove_number = board.fullmove_number
+        position.material = material_score(position)
+        position.key = position.zobrist_hash()
+        position.pawn_key = position.pawn_hash()
+        position.last_move = encode_move(board.move_stack[-1]) if board.move_stack else 0
+        return position
+
+    def to_board(self) -> chess.Board:
+        """Convert back to a chess.Board, without move history."""
+        board = chess.Board(None)
+        white = self.occupied_co[chess.WHITE]
+        for square, piece_type in enumerate(self.squares):
+            if piece_type:
+                board.set_piece_at(square, chess.Piece(piece_type, bool(white & _BB_SQUARES[square])))
+        board.turn = self.turn
+        board.castling_rights = self.castling_rights
+        board.ep_square = self.ep_square
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        return board
+
+    def copy(self) -> "Position":
+        """Copy of the position, without the undo stack."""
+        position = Position()
+        position.pieces = self.pieces[:]
+        position.occupied_co = self.occupied_co[:]
+        position.occupied = self.occupied
+        position.squares = self.squares[:]
+        position.turn = self.turn
+        position.castling_rights = self.castling_rights
+        position.ep_square = self.ep_square
+        position.halfmove_clock = self.halfmove_clock
+        position.fullmove_number = self.fullmove_number
+        position.material = self.material
+        position.key = self.key
+        position.pawn_key = self.pawn_key
+        position.last_move = self.last_move
+        return position
+
+    # chess.Board compatible views used by the evaluation
+
+    @property
+    def pawns(self) -> int:
+        return self.pieces[chess.PAWN]
+
+    @property
+    def knights(self) -> int:
+        return self.pieces[chess.KNIGHT]
+
+    @property
+    def bishops(self) -> int:
+        return self.pieces[chess.BISHOP]
+
+    @property
+    def rooks(self) -> int:
+        return self.pieces[chess.ROOK]
+
+    @property
+    def queens(self) -> int:
+        return self.pieces[chess.QUEEN]
+
+    @property
+    def kings(self) -> int:
+        return self.pieces[chess.KING]
+
+    def piece_type_at(self, square: int) -> int:
+        """Piece type on square, 0 if it is empty."""
+        return self.squares[square]
+
+    def king(self, color: chess.Color) -> int:
+        return (self.pieces[chess.KING] & self.occupied_co[color]).bit_length() - 1
+
+    def zobrist_hash(self) -> int:
+        """Polyglot Zobrist key computed from scratch, the same as
+        chess.polyglot.zobrist_hash. The search uses the key attribute, which
+        push and pop keep up to date; this is the reference to check it against."""
+        squares = self.squares
+        key = 0
+        for color in (chess.BLACK, chess.WHITE):
+            keys = _PIECE_KEYS[color]
+            occupied = self.occupied_co[color]
+            while occupied:
+                bit = occupied & -occupied
+                square = bit.bit_length() - 1
+                key ^= keys[squares[square]][square]
+                occupied ^= bit
+        key ^= _castling_key(self.castling_rights)
+        if self.ep_square is not None:
+            key ^= _EP_KEYS[self.ep_square & 7]
+        if self.turn == chess.WHITE:
+            key ^= _TURN_KEY
+        return key
+
+    def pawn_hash(self) -> int:
+        """Zobrist key of the pawns alone, computed from scratch: the polyglot
+        keys of the pawns, without castling, en passant or side to move.
+        0 when there are no pawns."""
+        key = 0
+        for color in (chess.BLACK, chess.WHITE):
+            keys = _PIECE_KEYS[color][chess.PAWN]
+            pawns = self.pieces[chess.PAWN] & self.occupied_co[color]
+            while pawns:
+                bit = pawns & -pawns
+                key ^= keys[bit.bit_length() - 1]
+                pawns ^= bit
+        return key
+
+    # Move properties
+
+    def is_capture(self, move: int) -> bool:
+        to_square = (move >> 6) & 63
+        return bool(self.squares[to_square]) or (
+            to_square == self.ep_square and self.squares[move & 63] == chess.PAWN)
+
+    def is_en_passant(self, move: int) -> bool:
+        return (move >> 6) & 63 == self.ep_square and self.squares[move & 63] == chess.PAWN
+
+    def is_castling(self, move: int) -> bool:
+        from_square = move & 63
+        return self.squares[from_square] == chess.KING and abs(((move >> 6) & 63) - from_square) == 2
+
+    # Attacks and checks
+
+    def attackers(self, color: chess.Color, square: int, occupied: int) -> int:
+        """Pieces of color attacking square, given the occupancy."""
+        pieces = self.pieces
+        queens = pieces[chess.QUEEN]
+        return ((_BB_KNIGHT_ATTACKS[square] & pieces[chess.KNIGHT])
+                | (_BB_KING_ATTACKS[square] & pieces[chess.KING])
+                | (_BB_PAWN_ATTACKS[not color][square] & pieces[chess.PAWN])
+                | ((_BB_RANK_ATTACKS[square][_BB_RANK_MASKS[square] & occupied]
+                    | _BB_FILE_ATTACKS[square][_BB_FILE_MASKS[square] & occupied])
+                   & (pieces[chess.ROOK] | queens))
+                | (_BB_DIAG_ATTACKS[square][_BB_DIAG_MASKS[square] & occupied]
+                   & (pieces[chess.BISHOP] | queens))) & self.occupied_co[color] & occupied
+
+    def is_check(self) -> bool:
+        us = self.turn
+        king = (self.pieces[chess.KING] & self.occupied_co[us]).bit_length() - 1
+        return bool(self.attackers(not us, king, self.occupied))
+
+    def _pinned(self, king: int) -> int:
+        """Pieces of the side to move pinned to its king."""
+        pieces = self.pieces
+        queens = pieces[chess.QUEEN]
+        snipers = (((_BB_RANK_ATTACKS[king][0] | _BB_FILE_ATTACKS[king][0]) & (pieces[chess.ROOK] | queens))
+                   | (_BB_DIAG_ATTACKS[king][0] & (pieces[chess.BISHOP] | queens))) \
+            & self.occupied_co[not self.turn]
+        occupied = self.occupied
+        between = _BB_BETWEEN[king]
+        pinned = 0
+        while snipers:
+            bit = snipers & -snipers
+            blockers = between[bit.bit_length() - 1] & occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers
+            snipers ^= bit
+        return pinned & self.occupied_co[self.turn]
+
+    def _is_safe_en_passant(self, king: int, from_square: int, to_square: int) -> bool:
+        """Whether an en passant capture leaves the own king safe. Two pawns
+        leave the rank at once, so pin detection doesn't cover it."""
+        captured = to_square - 8 if self.turn == chess.WHITE else to_square + 8
+        occupied = (self.occupied ^ _BB_SQUARES[from_square] ^ _BB_SQUARES[captured]) | _BB_SQUARES[to_square]
+        return not self.attackers(not self.turn, king, occupied)
+
+    # Move generation
+
+    def generate_moves(self, moves: List[int]):
+        """Append all legal moves to moves."""
+        self._generate(moves, True, True)
+
+    def generate_captures(self, moves: List[int]):
+        """Append legal captures, en passant and all promotions to moves."""
+        self._generate(moves, True, False)
+
+    def generate_quiets(self, moves: List[int]):
+        """Append the legal moves generate_captures leaves out: quiet moves
+        without promotion, and castling."""
+        self._generate(moves, False, True)
+
+    def _generate(self, moves: List[int], captures: bool, quiets: bool):
+        us = self.turn
+        pieces = self.pieces
+        own = self.occupied_co[us]
+        them = self.occupied_co[not us]
+        occupied = self.occupied
+        king = (pieces[chess.KING] & own).bit_length() - 1
+        checkers = self.attackers(not us, king, occupied)
+        append = moves.append
+
+        # Squares other pieces may move to: anywhere, or in check, the checker
+        # and the squares between it and the king. Nothing in double check.
+        if not checkers:
+            evasion = _BB_ALL
+        elif checkers & (checkers - 1):
+            evasion = 0
+        else:
+            evasion = checkers | _BB_BETWEEN[king][checkers.bit_length() - 1]
+        empty = ~occupied & _BB_ALL
+        targets = ((them if captures else 0) | (empty if quiets else 0)) & evasion
+
+        if evasion:
+            pinned = self._pinned(king)
+            rays = _BB_RAYS[king]
+
+            # Knights. A pinned knight can never move.
+            knights = pieces[chess.KNIGHT] & own & ~pinned
+            while knights:
+                bit = knights & -knights
+                from_square = bit.bit_length() - 1
+                attacks = _BB_KNIGHT_ATTACKS[from_square] & targets
+                while attacks:
+                    to_bit = attacks & -attacks
+                    append(from_square | (to_bit.bit_length() - 1) << 6)
+                    attacks ^= to_bit
+                knights ^= bit
+
+            # Bishops, rooks and queens
+            diagonal = pieces[chess.BISHOP] | pieces[chess.QUEEN]
+            straight = pieces[chess.ROOK] | pieces[chess.QUEEN]
+            sliders = (diagonal | straight) & own
+            while sliders:
+                bit = sliders & -sliders
+                from_square = bit.bit_length() - 1
+                attacks = 0
+                if bit & diagonal:
+                    attacks = _BB_DIAG_ATTACKS[from_square][_BB_DIAG_MASKS[from_square] & occupied]
+                if bit & straight:
+                    attacks |= (_BB_RANK_ATTACKS[from_square][_BB_RANK_MASKS[from_square] & occupied]
+                                | _BB_FILE_ATTACKS[from_square][_BB_FILE_MASKS[from_square] & occupied])
+                attacks &= targets
+                if bit & pinned:
+                    attacks &= rays[from_square]
+                while attacks:
+                    to_bit = attacks & -attacks
+                    append(from_square | (to_bit.bit_length() - 1) << 6)
+                    attacks ^= to_bit
+                sliders ^= bit
+
+            # Pawns
+            pawns = pieces[chess.PAWN] & own
+            if us == chess.WHITE:
+                forward = 8
+                single = (pawns << 8) & empty
+                double = ((single & chess.BB_RANK_3) << 8) & empty
+            else:
+                forward = -8
+                single = (pawns >> 8) & empty
+                double = ((single & chess.BB_RANK_6) >> 8) & empty
+            single &= evasion
+            double &= evasion
+
+            if captures:
+                # Captures, with or without promotion
+                capturers = pawns
+                while capturers:
+                    bit = capturers & -capturers
+                    from_square = bit.bit_length() - 1
+                    attacks = _BB_PAWN_ATTACKS[us][from_square] & them & evasion
+                    if bit & pinned:
+                        attacks &= rays[from_square]
+                    while attacks:
+                        to_bit = attacks & -attacks
+                        move = from_square | (to_bit.bit_length() - 1) << 6
+                        if to_bit & _BB_BACK_RANKS:
+                            for promotion in _PROMOTIONS:
+                                append(move | promotion << 12)
+                        else:
+                            append(move)
+                        attacks ^= to_bit
+                    capturers ^= bit
+
+                # Promotions without capture
+                pushes = single & _BB_BACK_RANKS
+                while pushes:
+                    to_bit = pushes & -pushes
+                    to_square = to_bit.bit_length() - 1
+                    from_square = to_square - forward
+                    if not _BB_SQUARES[from_square] & pinned or rays[from_square] & to_bit:
+                        move = from_square | to_square << 6
+                        for promotion in _PROMOTIONS:
+                            append(move | promotion << 12)
+                    pushes ^= to_bit
+
+            if quiets:
+                pushes = single & ~_BB_BACK_RANKS
+                while pushes:
+                    to_bit = pushes & -pushes
+                    to_square = to_bit.bit_length() - 1
+                    from_square = to_square - forward
+                    if not _BB_SQUARES[from_square] & pinned or rays[from_square] & to_bit:
+                        append(from_square | to_square << 6)
+                    pushes ^= to_bit
+                while double:
+                    to_bit = double & -double
+                    to_square = to_bit.bit_length() - 1
+                    from_square = to_square - 2 * forward
+                    if not _BB_SQUARES[from_square] & pinned or rays[from_square] & to_bit:
+                        append(from_square | to_square << 6)
+                    double ^= to_bit
+
+        # En passant, checked in full since it can even answer a double check
+        ep_square = self.ep_square
+        if captures and ep_square is not None:
+            capturers = _BB_PAWN_ATTACKS[not us][ep_square] & pieces[chess.PAWN] & own
+            while capturers:
+                bit = capturers & -capturers
+                from_square = bit.bit_length() - 1
+                if self._is_safe_en_passant(king, from_square, ep_square):
+                    append(from_square | ep_square << 6)
+                capturers ^= bit
+
+        # King moves, to squares not attacked once the king has left its square
+        attacks = _BB_KING_ATTACKS[king] & ((them if captures else 0) | (empty if quiets else 0))
+        if attacks:
+            without_king = occupied ^ _BB_SQUARES[king]
+            enemy = not us
+            while attacks:
+                to_bit = attacks & -attacks
+                to_square = to_bit.bit_length() - 1
+                if not self.attackers(enemy, to_square, without_king):
+                    append(king | to_square << 6)
+                attacks ^= to_bit
+
+        # Castling
+        if quiets and not checkers and self.castling_rights & own:
+            rank = 0 if us == chess.WHITE else 56
+            if king == rank + 4:
+                rights = self.castling_rights
+                enemy = not us
+                if (rights & _BB_SQUARES[rank + 7]
+                        and not occupied & (_BB_SQUARES[rank + 5] | _BB_SQUARES[rank + 6])
+                        and not self.attackers(enemy, rank + 5, occupied)
+                        and not self.attackers(enemy, rank + 6, occupied)):
+                    append(king | (rank + 6) << 6)
+                if (rights & _BB_SQUARES[rank]
+                        and not occupied & (_BB_SQUARES[rank + 1] | _BB_SQUARES[rank + 2] | _BB_SQUARES[rank + 3])
+                        and not self.attackers(enemy, rank + 3, occupied)
+                        and not self.attackers(enemy, rank + 2, occupied)):
+                    append(king | (rank + 2) << 6)
+
+    def is_legal(self, move: int) -> bool:
+        """Whether move is legal here, e.g. a hash or killer move found at
+        another node. Cheaper than generating all moves."""
+        if not move:
+            return False
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = move >> 12
+        from_bit = _BB_SQUARES[from_square]
+        to_bit = _BB_SQUARES[to_square]
+        us = self.turn
+        own = self.occupied_co[us]
+        occupied = self.occupied
+        if not own & from_bit or own & to_bit:
+            return False
+        piece_type = self.squares[from_square]
+        if piece_type == chess.PAWN:
+            if bool(to_bit & _BB_BACK_RANKS) != (chess.KNIGHT <= promotion <= chess.QUEEN):
+                return False
+        elif promotion:
+            return False
+
+        king = (self.pieces[chess.KING] & own).bit_length() - 1
+
+        # Pseudo-legality
+        if piece_type == chess.PAWN:
+            forward = 8 if us == chess.WHITE else -8
+            if _BB_PAWN_ATTACKS[us][from_square] & to_bit:
+                if to_square == self.ep_square:
+                    return self._is_safe_en_passant(king, from_square, to_square)
+                if not self.occupied_co[not us] & to_bit:
+                    return False
+            elif to_square == from_square + forward:
+                if occupied & to_bit:
+                    return False
+            elif to_square == from_square + 2 * forward:
+                if (occupied & (to_bit | _BB_SQUARES[from_square + forward])
+                        or not from_bit & (chess.BB_RANK_2 if us == chess.WHITE else chess.BB_RANK_7)):
+                    return False
+            else:
+                return False
+        elif piece_type == chess.KNIGHT:
+            if not _BB_KNIGHT_ATTACKS[from_square] & to_bit:
+                return False
+        elif piece_type == chess.KING:
+            if abs(to_square - from_square) == 2:
+                moves = []
+                self._generate(moves, False, True)
+                return move in moves
+            if not _BB_KING_ATTACKS[from_square] & to_bit:
+                return False
+            return not self.attackers(not us, to_square, occupied ^ from_bit)
+        else:
+            attacks = 0
+            if piece_type != chess.ROOK:
+                attacks = _BB_DIAG_ATTACKS[from_square][_BB_DIAG_MASKS[from_square] & occupied]
+            if piece_type != chess.BISHOP:
+                attacks |= (_BB_RANK_ATTACKS[from_square][_BB_RANK_MASKS[from_square] & occupied]
+                            | _BB_FILE_ATTACKS[from_square][_BB_FILE_MASKS[from_square] & occupied])
+            if not attacks & to_bit:
+                return False
+
+        # Legality: evade a check, and pinned pieces stay on the pin ray
+        checkers = self.attackers(not us, king, occupied)
+        if checkers:
+            if checkers & (checkers - 1):
+                return False
+            if not to_bit & (checkers | _BB_BETWEEN[king][checkers.bit_length() - 1]):
+                return False
+        return not from_bit & self._pinned(king) or bool(_BB_RAYS[king][from_square] & to_bit)
+
+    # Make and unmake
+
+    def push(self, move: int):
+        """Make a legal move, or pass with the null move 0."""
+        us = self.turn
+        self._stack.append((move, self.squares[(move >> 6) & 63], self.castling_rights, self.ep_square,
+                            self.halfmove_clock, self.material, self.key, self.pawn_key, self.last_move))
+        key = self.key ^ _TURN_KEY
+        if self.ep_square is not None:
+            key ^= _EP_KEYS[self.ep_square & 7]
+        self.last_move = move
+        self.ep_square = None
+        self.halfmove_clock += 1
+        if us == chess.BLACK:
+            self.fullmove_number += 1
+        self.turn = not us
+        if not move:
+            self.key = key
+            return
+
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = move >> 12
+        from_bit = _BB_SQUARES[from_square]
+        to_bit = _BB_SQUARES[to_square]
+        pieces = self.pieces
+        squares = self.squares
+        occupied_co = self.occupied_co
+        scores = PIECE_SQUARE_SCORES[us]
+        keys = _PIECE_KEYS[us]
+        piece_type = squares[from_square]
+        placed = promotion or piece_type
+
+        captured = squares[to_square]
+        delta = 0
+        if captured:
+            pieces[captured] ^= to_bit
+            occupied_co[not us] ^= to_bit
+            delta = PIECE_SQUARE_SCORES[not us][captured][to_square]
+            key ^= _PIECE_KEYS[not us][captured][to_square]
+            if captured == chess.PAWN:
+                self.pawn_key ^= _PIECE_KEYS[not us][chess.PAWN][to_square]
+            self.halfmove_clock = 0
+
+        pieces[piece_type] ^= from_bit
+        pieces[placed] ^= to_bit
+        occupied_co[us] ^= from_bit | to_bit
+        squares[from_square] = 0
+        squares[to_square] = placed
+        delta += scores[placed][to_square] - scores[piece_type][from_square]
+        key ^= keys[piece_type][from_square] ^ keys[placed][to_square]
+
+        if piece_type == chess.PAWN:
+            self.halfmove_clock = 0
+            self.pawn_key ^= keys[chess.PAWN][from_square] ^ (0 if promotion else keys[chess.PAWN][to_square])
+            distance = to_square - from_square
+            if distance == 16 or distance == -16:
+                ep_square = from_square + (distance >> 1)
+                if _BB_PAWN_ATTACKS[us][ep_square] & pieces[chess.PAWN] & occupied_co[not us]:
+                    self.ep_square = ep_square
+                    key ^= _EP_KEYS[ep_square & 7]
+            elif not captured and distance & 7:
+                # En passant: the captured pawn is beside the moving one
+                captured_square = to_square - 8 if us == chess.WHITE else to_square + 8
+                captured_bit = _BB_SQUARES[captured_square]
+                pieces[chess.PAWN] ^= captured_bit
+                occupied_co[not us] ^= captured_bit
+                squares[captured_square] = 0
+                delta += PIECE_SQUARE_SCORES[not us][chess.PAWN][captured_square]
+                key ^= _PIECE_KEYS[not us][chess.PAWN][captured_square]
+                self.pawn_key ^= _PIECE_KEYS[not us][chess.PAWN][captured_square]
+        elif piece_type == chess.KING:
+            if to_square - from_square == 2 or from_square - to_square == 2:
+                if to_square > from_square:
+                    rook_from, rook_to = to_square + 1, to_square - 1
+                else:
+                    rook_from, rook_to = to_square - 2, to_square + 1
+                rook_bits = _BB_SQUARES[rook_from] | _BB_SQUARES[rook_to]
+                pieces[chess.ROOK] ^= rook_bits
+                occupied_co[us] ^= rook_bits
+                squares[rook_from] = 0
+                squares[rook_to] = chess.ROOK
+                delta += scores[chess.ROOK][rook_to] - scores[chess.ROOK][rook_from]
+                key ^= keys[chess.ROOK][rook_from] ^ keys[chess.ROOK][rook_to]
+
+        # Castling rights are lost when the king moves, or a rook moves or is captured
+        rights = self.castling_rights
+        if rights:
+            lost = rights & (from_bit | to_bit)
+            if piece_type == chess.KING:
+                lost |= rights & (chess.BB_RANK_1 if us == chess.WHITE else chess.BB_RANK_8)
+            if lost:
+                self.castling_rights = rights ^ lost
+                key ^= _castling_key(lost)
+
+        self.occupied = occupied_co[0] | occupied_co[1]
+        self.material += delta if us == chess.WHITE else -delta
+        self.key = key
+
+    def pop(self):
+        """Unmake the last move made with push."""
+        (move, captured, self.castling_rights, ep_square, self.halfmove_clock,
+         self.material, self.key, self.pawn_key, self.last_move) = self._stack.pop()
+        self.ep_square = ep_square
+        us = not self.turn
+        self.turn = us
+        if us == chess.BLACK:
+            self.fullmove_number -= 1
+        if not move:
+            return
+
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        from_bit = _BB_SQUARES[from_square]
+        to_bit = _BB_SQUARES[to_square]
+        pieces = self.pieces
+        squares = self.squares
+        occupied_co = self.occupied_co
+        placed = squares[to_square]
+        piece_type = chess.PAWN if move >> 12 else placed
+
+        pieces[placed] ^= to_bit
+        pieces[piece_type] ^= from_bit
+        occupied_co[us] ^= from_bit | to_bit
+        squares[from_square] = piece_type
+        squares[to_square] = captured
+
+        if captured:
+            pieces[captured] ^= to_bit
+            occupied_co[not us] ^= to_bit
+        elif piece_type == chess.PAWN:
+            if to_square == ep_square:
+                captured_square = to_square - 8 if us == chess.WHITE else to_square + 8
+                captured_bit = _BB_SQUARES[captured_square]
+                pieces[chess.PAWN] ^= captured_bit
+                occupied_co[not us] ^= captured_bit
+                squares[captured_square] = chess.PAWN
+        elif piece_type == chess.KING and (to_square - from_square == 2 or from_square - to_square == 2):
+            if to_square > from_square:
+                rook_from, rook_to = to_square + 1, to_square - 1
+            else:
+                rook_from, rook_to = to_square - 2, to_square + 1
+            rook_bits = _BB_SQUARES[rook_from] | _BB_SQUARES[rook_to]
+            pieces[chess.ROOK] ^= rook_bits
+            occupied_co[us] ^= rook_bits
+            squares[rook_from] = chess.ROOK
+            squares[rook_to] = 0
+
+        self.occupied = occupied_co[0] | occupied_co[1]
+
+
+def _castling_key(rights: int) -> int:
+    """Zobrist key of a set of castling rights (rook squares)."""
+    key = 0
+    for rook_square, rook_key in _CASTLING_KEYS:
+        if rights & rook_square:
+            key ^= rook_key
+    return key
@@ -0,0 +1,181 @@
+import chess
+import multiprocessing
+import queue
+from typing import Dict, List, Optional
+
+from ai.minimax import MinimaxAI
+
+# Messages to the worker, as tuples starting with their kind:
+#   ("new_game", settings)         -- settings: {color: MinimaxAI keyword arguments}
+#                                     for each color the AI plays
+#   ("position", search_id, color, board)
+#                                  -- search board with the AI of color
+#   ("analyse", search_id, settings, board, multi_pv)
+#                                  -- top multi_pv moves of board, from an
+#                                     analysis MinimaxAI made from settings
+#   ("quit",)
+#
+# Messages from the worker:
+#   ("info", search_id, info)      -- progress, as passed to find_best_move's info
+#                                     callback: at most every INFO_INTERVAL
+#                                     seconds, and once before bestmove
+#   ("bestmove", search_id, move, ponder_move)
+#   ("lines", search_id, lines)    -- answer to analyse: AnalysisLines, best first
+#   ("error", search_id, message)
+#
+# Stopping can't be a queued message: the worker only reads its queue between
+# searches. stop() raises a shared search id instead, and every search with an
+# id up to it stops.
+
+
+# Kinds of the last message of each search
+_FINAL_MESSAGES = ("bestmove", "lines", "error")
+
+
+class _StopToken:
+    """Stop token of one search, set once the shared stop id reaches it."""
+
+    def __init__(self, stopped_id, search_id: int):
+        self._stopped_id = stopped_id
+        self._search_id = search_id
+
+    def is_set(self) -> bool:
+        return self._stopped_id.value >= self._search_id
+
+
+class SearchWorker:
+    """A process that runs MinimaxAI searches, so they get a core of their
+    own instead of competing with the GUI thread for the GIL.
+
+    The process is started once and reused for every game. Searches run one
+    at a time, in the order they are started; results come back through
+    poll(), tagged with the id start() or analyse() returned.
+    """
+
+    def __init__(self):
+        # Spawned, not forked: the parent runs pygame
+        self._context = multiprocessing.get_context("spawn")
+        self._stopped_id = self._context.RawValue('q', 0)
+        self._search_id = 0
+        # Searches started whose final message hasn't been polled yet, and
+        # errors for those lost with a dead process, for the next poll
+        self._pending: List[int] = []
+        self._lost: List[tuple] = []
+        self._settings: Dict[chess.Color, dict] = {}
+        self._process = None
+        self._start_process()
+
+    def _start_process(self):
+        self._commands = self._context.Queue()
+        self._events = self._context.Queue()
+        self._process = self._context.Process(target=_worker_main, daemon=True,
+                                              args=(self._commands, self._events, self._stopped_id))
+        self._process.start()
+        if self._settings:
+            self._commands.put(("new_game", self._settings))
+
+    def new_game(self, settings: Dict[chess.Color, dict]):
+        """Set up the AIs of a new game, by color, from MinimaxAI keyword arguments."""
+        self._settings = settings
+        self._commands.put(("new_game", settings))
+
+    def start(self, board: chess.Board, color: chess.Color) -> int:
+        """Queue a search of board by the AI of color and return its search id."""
+        search_id = self._next_search_id()
+        self._commands.put(("position", search_id, color, board))
+        return search_id
+
+    def analyse(self, board: chess.Board, settings: dict, multi_pv: int) -> int:
+        """Queue a Multi-PV analysis of board, by a MinimaxAI made from settings
+        and kept while they stay the same, and return its search id. The
+        answer is a "lines" message."""
+        search_id = self._next_search_id()
+        self._commands.put(("analyse", search_id, settings, board, multi_pv))
+        return search_id
+
+    def _next_search_id(self) -> int:
+        if not self._process.is_alive():
+            # Restart after a crash, so one failed search doesn't end the game
+            self._restart()
+        self._search_id += 1
+        self._pending.append(self._search_id)
+        return self._search_id
+
+    def stop(self, search_id: int):
+        """Stop the search with this id, and any earlier one. It still sends
+        its bestmove or lines, within milliseconds."""
+        if search_id > self._stopped_id.value:
+            self._stopped_id.value = search_id
+
+    def poll(self) -> List[tuple]:
+        """Messages the worker has sent since the last poll, without waiting."""
+        messages = self._lost
+        self._lost = []
+        while True:
+            try:
+                message = self._events.get_nowait()
+            except queue.Empty:
+                break
+            messages.append(message)
+            if message[0] in _FINAL_MESSAGES and message[1] in self._pending:
+                self._pending.remove(message[1])
+        if not messages and not self._process.is_alive():
+            self._restart()
+            messages, self._lost = self._lost, []
+        return messages
+
+    def _restart(self):
+        """Start a new process after the last one died (out of memory,
+        killed). Its unfinished searches fail rather than wait forever."""
+        self._lost += [("error", search_id, f"Search worker exited with code {self._process.exitcode}")
+                       for search_id in self._pending]
+        self._pending = []
+        self._start_process()
+
+    def close(self):
+        """Stop any search and end the process."""
+        self.stop(self._search_id)
+        self._commands.put(("quit",))
+        self._process.join(1.0)
+        if self._process.is_alive():
+            self._process.terminate()
+
+
+def _worker_main(commands, events, stopped_id):
+    """Entry point of the search process."""
+    ais: Dict[chess.Color, MinimaxAI] = {}
+    # Kept between analyses so its tables aren't reallocated for each one
+    analyst: Optional[MinimaxAI] = None
+    analyst_settings = None
+    while True:
+        message = commands.get()
+        kind = message[0]
+        if kind == "quit":
+            return
+        if kind == "new_game":
+            ais = {color: MinimaxAI(ai_color=color, **settings) for color, settings in message[1].items()}
+        elif kind == "position":
+            _, search_id, color, board = message
+            stop = _StopToken(stopped_id, search_id)
+            ai = ais.get(color)
+            if ai is None:
+                events.put(("error", search_id, f"No AI plays {chess.COLOR_NAMES[color]}"))
+                continue
+            try:
+                move = ai.find_best_move(board, stop=stop,
+                                         info=lambda info: events.put(("info", search_id, info)))
+            except Exception as e:
+                events.put(("error", search_id, f"{type(e).__name__}: {e}"))
+                continue
+            events.put(("bestmove", search_id, move, ai.ponder_move))
+        elif kind == "analyse":
+            _, search_id, settings, board, multi_pv = message
+            if settings != analyst_settings:
+                analyst = MinimaxAI(**settings)
+                analyst_settings = settings
+            try:
+                lines = analyst.analyse(board, multi_pv, stop=_StopToken(stopped_id, search_id))
+            except Exception as e:
+                events.put(("error", search_id, f"{type(e).__name__}: {e}"))
+                continue
+            events.put(("lines", search_id, lines))
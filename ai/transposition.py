@@ -0,0 +1,139 @@
+import chess
+import ctypes
+from array import array
+from multiprocessing.sharedctypes import RawArray
+from typing import Optional, Tuple
+
+# Bound types stored with each entry
+EXACT = 0
+LOWER = 1  # Score is a lower bound (search failed high)
+UPPER = 2  # Score is an upper bound (search failed low)
+
+# Each entry takes two 64-bit words: the verification key and the packed data
+ENTRY_BYTES = 16
+
+# Layout of the packed data word
+_MOVE_BITS = 16
+_DEPTH_SHIFT = 16
+_BOUND_SHIFT = 24
+_GEN_SHIFT = 26
+_SCORE_SHIFT = 32
+_SCORE_OFFSET = 1 << 31
+_GEN_MASK = 0x3F
+
+
+def encode_move(move: Optional[chess.Move]) -> int:
+    """Pack a move into 16 bits: from (6) | to (6) | promotion piece type (3)."""
+    if move is None:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code: int) -> Optional[chess.Move]:
+    """Unpack a move encoded with encode_move. 0 means "no move"."""
+    if not code:
+        return None
+    return chess.Move(code & 63, (code >> 6) & 63, (code >> 12) or None)
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results keyed by Zobrist hash.
+
+    The table is preallocated from size_mb, so memory use does not grow during
+    long sessions. Replacement keeps the deeper result for the same search and
+    always overwrites entries left over from earlier searches.
+
+    A shared table lives in shared memory and can be passed to other processes
+    (as a multiprocessing.Process argument), which then read and write the
+    same entries without locks: keys are stored XORed with their data, so an
+    entry torn by two concurrent writes fails verification instead of
+    returning a wrong result.
+    """
+
+    def __init__(self, size_mb: int = 16, shared: bool = False):
+        entries = max(1, (size_mb * 1024 * 1024) // ENTRY_BYTES)
+        # Round down to a power of two so the index is a simple mask
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.shared = shared
+        if shared:
+            self._buffers = (RawArray('Q', self.size), RawArray('Q', self.size))
+            self._bind_buffers()
+        else:
+            self.keys = array('Q', bytes(8 * self.size))
+            self.data = array('Q', bytes(8 * self.size))
+        self.generation = 0
+
+    def _bind_buffers(self):
+        # Plain 'Q' memoryviews index as fast as array('Q'); ctypes arrays are much slower
+        self.keys, self.data = (memoryview(buffer).cast('B').cast('Q') for buffer in self._buffers)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.shared:
+            # Memoryviews can't be pickled; they are rebuilt on the shared buffers
+            del state["keys"], state["data"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.shared:
+            self._bind_buffers()
+
+    def clear(self):
+        """Remove all entries."""
+        if self.shared:
+            # Other processes hold the same buffers, so clear them in place
+            for buffer in self._buffers:
+                ctypes.memset(buffer, 0, ctypes.sizeof(buffer))
+        else:
+            self.keys = array('Q', bytes(8 * self.size))
+            self.data = array('Q', bytes(8 * self.size))
+        self.generation = 0
+
+    def new_search(self):
+        """Age the table so entries from previous searches get replaced first."""
+        self.generation = (self.generation + 1) & _GEN_MASK
+
+    def hashfull(self) -> int:
+        """Permille of entries written by the current search, sampled from
+        the first thousand entries like UCI's hashfull."""
+        sample = min(1000, self.size)
+        used = sum(1 for data in self.data[:sample]
+                   if data and ((data >> _GEN_SHIFT) & _GEN_MASK) == self.generation)
+        return used * 1000 // sample
+
+    def probe(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+        """Look up a position.
+
+        Returns (depth, score, bound, move_code) or None if the position is not stored.
+        """
+        index = key & self.mask
+        data = self.data[index]
+        # Keys are stored XORed with the data so torn entries never verify
+        if not data or self.keys[index] ^ data != key:
+            return None
+        return ((data >> _DEPTH_SHIFT) & 0xFF,
+                ((data >> _SCORE_SHIFT) & 0xFFFFFFFF) - _SCORE_OFFSET,
+                (data >> _BOUND_SHIFT) & 0x3,
+                data & 0xFFFF)
+
+    def store(self, key: int, depth: int, score: int, bound: int, move_code: int):
+        """Store a search result, subject to the replacement policy."""
+        index = key & self.mask
+        old = self.data[index]
+        if old and ((old >> _GEN_SHIFT) & _GEN_MASK) == self.generation:
+            same_position = self.keys[index] ^ old == key
+            if not same_position and ((old >> _DEPTH_SHIFT) & 0xFF) > depth:
+                # Keep the deeper entry from the current search
+                return
+            if same_position and not move_code:
+                # Don't lose a known best move to an all-node result
+                move_code = old & 0xFFFF
+        data = (move_code
+                | (max(0, min(depth, 0xFF)) << _DEPTH_SHIFT)
+                | (bound << _BOUND_SHIFT)
+                | (self.generation << _GEN_SHIFT)
+                | ((int(score) + _SCORE_OFFSET) << _SCORE_SHIFT))
+        self.data[index] = data
+        self.keys[index] = key ^ data
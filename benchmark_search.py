@@ -0,0 +1,473 @@
+import chess
+import chess.polyglot
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+import builtins
+from contextlib import contextmanager
+from typing import Optional
+
+from ai.minimax import MinimaxAI, SearchLimit
+from ai.move_ordering import see
+from ai.nnue import NNUEPosition, load_network, random_network
+from ai.position import Position
+from ai.transposition import encode_move
+from evaluate_vs_stockfish import TEST_POSITIONS
+from game.batch_evaluation import encode_boards, evaluate_boards, evaluate_encoded
+from game.move_generator import PIECE_VALUES, PIECE_TABLES, evaluate_board, evaluate_position, material_score
+
+# --- Configuration ---
+DEFAULT_DEPTH = 3
+RANDOM_SEED = 2024  # Fixed so random playouts give the same positions every run
+PLAYOUT_PLIES = 40  # Length of the random playouts used to sample positions
+
+# Standard perft positions with castling, en passant and promotion corner cases
+PERFT_POSITIONS = {
+    "Kiwipete": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "Perft Position 3": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "Perft Position 4": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "Perft Position 5": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+}
+
+
+@contextmanager
+def count_calls(owner, name: str, counts: dict):
+    """Temporarily wrap owner.name so every call is counted in counts[name]."""
+    original = getattr(owner, name)
+
+    def wrapper(*args, **kwargs):
+        counts[name] += 1
+        return original(*args, **kwargs)
+
+    counts[name] = 0
+    setattr(owner, name, wrapper)
+    try:
+        yield
+    finally:
+        setattr(owner, name, original)
+
+
+@contextmanager
+def quiet():
+    """Silence the "Nodes evaluated" line printed by find_best_move."""
+    original = builtins.print
+    builtins.print = lambda *args, **kwargs: None
+    try:
+        yield
+    finally:
+        builtins.print = original
+
+
+def total_nodes(ai: MinimaxAI) -> int:
+    return ai.nodes_evaluated + getattr(ai, "qnodes_evaluated", 0)
+
+
+def bench_allocations(depth: int):
+    """Per-node allocation sources of the search: chess.Board copies and legal
+    move lists (only left at the search boundary) and Position pushes (each
+    allocates one undo tuple), plus the peak memory traced during the search."""
+    print(f"Allocation benchmark, depth {depth}")
+    print(f"{'Position':<34}{'nodes':>8}{'copies/n':>10}{'lists/n':>9}{'push/n':>8}{'peak KB':>9}{'time s':>8}")
+    totals = {"nodes": 0, "copy": 0, "__iter__": 0, "push": 0}
+    for name, fen in TEST_POSITIONS.items():
+        board = chess.Board(fen)
+        ai = MinimaxAI(max_depth=depth)
+        counts = {}
+        with count_calls(chess.Board, "copy", counts), \
+                count_calls(chess.LegalMoveGenerator, "__iter__", counts), \
+                count_calls(Position, "push", counts), quiet():
+            tracemalloc.start()
+            start = time.perf_counter()
+            ai.find_best_move(board)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        nodes = max(1, total_nodes(ai))
+        totals["nodes"] += nodes
+        for key in ("copy", "__iter__", "push"):
+            totals[key] += counts[key]
+        print(f"{name:<34}{nodes:>8}{counts['copy'] / nodes:>10.2f}{counts['__iter__'] / nodes:>9.2f}"
+              f"{counts['push'] / nodes:>8.2f}{peak / 1024:>9.0f}{elapsed:>8.2f}")
+
+    nodes = totals["nodes"]
+    print(f"{'Total':<34}{nodes:>8}{totals['copy'] / nodes:>10.2f}{totals['__iter__'] / nodes:>9.2f}"
+          f"{totals['push'] / nodes:>8.2f}")
+
+
+def bench_search(depth: int, eval_cache_mb: int, **features):
+    """Nodes and time to reach a fixed depth, with selective search features
+    switchable, and how often the evaluation cache and pawn hash hit."""
+    print(f"Search benchmark, depth {depth}, eval cache {eval_cache_mb} MB, "
+          + ", ".join(f"{name} {'on' if enabled else 'off'}" for name, enabled in features.items()))
+    print(f"{'Position':<34}{'move':>7}{'score':>7}{'nodes':>9}{'qnodes':>9}{'hits %':>8}{'evict':>7}"
+          f"{'pawn %':>8}{'time s':>8}")
+    total_main = total_quiescence = total_hits = total_lookups = total_pawn_hits = total_pawn_lookups = 0
+    total_time = 0.0
+    for name, fen in TEST_POSITIONS.items():
+        ai = MinimaxAI(max_depth=depth, eval_cache_mb=eval_cache_mb, **features)
+        with quiet():
+            start = time.perf_counter()
+            move = ai.find_best_move(chess.Board(fen))
+            elapsed = time.perf_counter() - start
+        cache = ai.eval_cache
+        hits, lookups, evictions = (cache.hits, cache.hits + cache.misses, cache.evictions) if cache else (0, 0, 0)
+        pawn_hits, pawn_lookups = ai.pawn_hash.hits, ai.pawn_hash.hits + ai.pawn_hash.misses
+        total_main += ai.nodes_evaluated
+        total_quiescence += ai.qnodes_evaluated
+        total_hits += hits
+        total_lookups += lookups
+        total_pawn_hits += pawn_hits
+        total_pawn_lookups += pawn_lookups
+        total_time += elapsed
+        print(f"{name:<34}{str(move):>7}{ai.best_score:>7}{ai.nodes_evaluated:>9}"
+              f"{ai.qnodes_evaluated:>9}{100 * hits / max(1, lookups):>8.1f}{evictions:>7}"
+              f"{100 * pawn_hits / max(1, pawn_lookups):>8.1f}{elapsed:>8.2f}")
+    print(f"{'Total':<34}{'':>14}{total_main:>9}{total_quiescence:>9}"
+          f"{100 * total_hits / max(1, total_lookups):>8.1f}{'':>7}"
+          f"{100 * total_pawn_hits / max(1, total_pawn_lookups):>8.1f}{total_time:>8.2f}")
+
+
+def sample_positions(playouts: int) -> list:
+    """TEST_POSITIONS plus positions reached by seeded random playouts from them."""
+    rng = random.Random(RANDOM_SEED)
+    positions = []
+    for fen in TEST_POSITIONS.values():
+        positions.append(chess.Board(fen))
+        for _ in range(playouts):
+            board = chess.Board(fen)
+            for _ in range(rng.randrange(1, PLAYOUT_PLIES)):
+                moves = list(board.legal_moves)
+                if not moves:
+                    break
+                board.push(rng.choice(moves))
+            positions.append(board)
+    return positions
+
+
+def bench_see(playouts: int, repeat: int):
+    """Static exchange evaluation calls per second on every capture of the sample positions."""
+    captures = []
+    for board in sample_positions(playouts):
+        position = Position.from_board(board)
+        captures.extend((position, encode_move(move)) for move in board.generate_legal_captures())
+    results = [see(board, move) for board, move in captures]
+    print(f"SEE benchmark: {len(captures)} captures from {playouts} playouts per test position")
+    print(f"  winning: {sum(1 for r in results if r > 0)}, "
+          f"equal: {sum(1 for r in results if r == 0)}, "
+          f"losing: {sum(1 for r in results if r < 0)}")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for board, move in captures:
+            see(board, move)
+    elapsed = time.perf_counter() - start
+    calls = repeat * len(captures)
+    print(f"  {calls} calls in {elapsed:.2f}s: {calls / elapsed:,.0f} calls/s")
+
+
+def reference_evaluate_position(board: chess.Board, for_color: chess.Color = None) -> int:
+    """The evaluator evaluate_position replaced, kept as a speed reference: a
+    64-square piece_at loop plus a full legal move generation for the mobility
+    of the side to move."""
+    if for_color is None:
+        for_color = board.turn
+    score = 0
+    for square in chess.SQUARES:
+        piece = board.piece_at(square)
+        if piece is not None:
+            table_index = square if piece.color == chess.BLACK else chess.square_mirror(square)
+            piece_score = PIECE_VALUES[piece.piece_type] + PIECE_TABLES[piece.piece_type][table_index]
+            score += piece_score if piece.color == for_color else -piece_score
+    mobility_score = len(list(board.legal_moves)) * 10
+    score += mobility_score if board.turn == for_color else -mobility_score
+    return score
+
+
+def bench_eval(playouts: int, repeat: int) -> int:
+    """Leaf evaluations per second of the reference and current evaluators, plus
+    a check that the current one is symmetric between the two sides. Returns
+    the number of asymmetric positions."""
+    positions = sample_positions(playouts)
+    asymmetric = sum(1 for board in positions
+                     if evaluate_position(board, chess.WHITE) != -evaluate_position(board, chess.BLACK)
+                     or evaluate_position(board.mirror(), chess.WHITE) != evaluate_position(board, chess.BLACK))
+    print(f"Evaluation benchmark: {len(positions)} positions from {playouts} playouts per test position")
+    print(f"  symmetry: {'ok' if not asymmetric else f'{asymmetric} positions differ'}")
+
+    rates = {}
+    for name, evaluate in (("reference", reference_evaluate_position), ("current", evaluate_position)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for board in positions:
+                evaluate(board)
+        elapsed = time.perf_counter() - start
+        rates[name] = repeat * len(positions) / elapsed
+        print(f"  {name:<10}{repeat * len(positions):>8} leaves in {elapsed:.2f}s: {rates[name]:,.0f} leaves/s")
+    print(f"  speedup: {rates['current'] / rates['reference']:.1f}x")
+    return asymmetric
+
+
+def bench_batch(playouts: int, repeat: int) -> int:
+    """Positions per second of the batch evaluator against evaluate_board one
+    board at a time, plus a check that both give the same scores. Returns
+    the number of positions scored differently."""
+    positions = sample_positions(playouts)
+    expected = [evaluate_board(board) for board in positions]
+    mismatches = sum(1 for score, batch_score, fen_score
+                     in zip(expected, evaluate_boards(positions), evaluate_boards(board.fen() for board in positions))
+                     if score != batch_score or score != fen_score)
+    print(f"Batch evaluation benchmark: {len(positions)} positions from {playouts} playouts per test position")
+    print(f"  scores: {'match' if not mismatches else f'{mismatches} positions differ'}")
+
+    bitboards, turns = encode_boards(positions)
+    many_bitboards = bitboards.repeat(repeat, axis=0)
+    many_turns = turns.repeat(repeat)
+    count = repeat * len(positions)
+    fens = [board.fen() for board in positions]
+    timings = (
+        ("evaluate_board", lambda: [evaluate_board(board) for _ in range(repeat) for board in positions]),
+        ("evaluate_boards", lambda: evaluate_boards(positions * repeat)),
+        ("  from FENs", lambda: evaluate_boards(fens * repeat)),
+        ("encode_boards", lambda: encode_boards(positions * repeat)),
+        ("evaluate_encoded", lambda: evaluate_encoded(many_bitboards, many_turns)),
+    )
+    for name, run in timings:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<18}{count:>8} positions in {elapsed:.2f}s: {count / elapsed:,.0f} positions/s")
+    return mismatches
+
+
+def bench_nnue(weights: Optional[str], depth: int, nodes: int, playouts: int) -> int:
+    """Check NNUEPosition's incremental accumulators against the reference
+    evaluation along random playouts, then compare search speed with the
+    classical evaluation and the network. Returns the number of positions
+    where the incremental evaluation differs."""
+    network = load_network(weights) if weights else random_network()
+    print(f"NNUE benchmark: {weights or 'random network'}, hidden size {network.hidden_size}")
+    rng = random.Random(RANDOM_SEED)
+    checked = mismatches = 0
+    for fen in TEST_POSITIONS.values():
+        for _ in range(playouts):
+            board = chess.Board(fen)
+            position = NNUEPosition.from_board(board, network)
+            for _ in range(rng.randrange(1, PLAYOUT_PLIES)):
+                moves = list(board.legal_moves)
+                if not moves:
+                    break
+                move = rng.choice(moves)
+                board.push(move)
+                position.push(encode_move(move))
+                checked += 1
+                mismatches += position.evaluate() != network.evaluate(board)
+            while board.move_stack:
+                board.pop()
+                position.pop()
+                checked += 1
+                mismatches += position.evaluate() != network.evaluate(board)
+    print(f"  incremental vs reference: {checked} positions, "
+          f"{'all match' if not mismatches else f'{mismatches} differ'}")
+
+    print(f"  depth {depth} or {nodes} nodes per position, evaluation cache off")
+    print(f"  {'evaluation':<12}{'nodes':>9}{'qnodes':>9}{'time s':>8}{'nodes/s':>10}")
+    for name, nnue in (("classical", None), ("nnue", network)):
+        main = quiescence = 0
+        elapsed = 0.0
+        for fen in TEST_POSITIONS.values():
+            ai = MinimaxAI(max_depth=depth, eval_cache_mb=0, nnue=nnue)
+            with quiet():
+                start = time.perf_counter()
+                ai.find_best_move(chess.Board(fen), SearchLimit(depth=depth, nodes=nodes))
+                elapsed += time.perf_counter() - start
+            main += ai.nodes_evaluated
+            quiescence += ai.qnodes_evaluated
+        print(f"  {name:<12}{main:>9}{quiescence:>9}{elapsed:>8.2f}{(main + quiescence) / elapsed:>10,.0f}")
+    return mismatches
+
+
+def bench_smp(depth: int, worker_counts: list):
+    """Time to depth with Lazy SMP for each worker count. Helper processes are
+    started by a warm-up search, and the shared table is cleared before each
+    position, so the times compare searches only."""
+    print(f"Lazy SMP benchmark, depth {depth}, workers {', '.join(map(str, worker_counts))}")
+    print(f"{'workers':<10}{'main nodes':>12}{'helper nodes':>14}{'time s':>8}{'speedup':>9}")
+    base_time = None
+    for workers in worker_counts:
+        ai = MinimaxAI(max_depth=depth, workers=workers)
+        main_nodes = helper_nodes = 0
+        elapsed = 0.0
+        with quiet():
+            ai.find_best_move(chess.Board(), SearchLimit(depth=1))
+            for fen in TEST_POSITIONS.values():
+                ai.tt.clear()
+                start = time.perf_counter()
+                ai.find_best_move(chess.Board(fen))
+                elapsed += time.perf_counter() - start
+                main_nodes += ai.total_nodes()
+                helper_nodes += ai.helper_nodes
+        ai.close()
+        base_time = base_time or elapsed
+        print(f"{workers:<10}{main_nodes:>12}{helper_nodes:>14}{elapsed:>8.2f}{base_time / elapsed:>8.2f}x")
+
+
+def perft(position: Position, depth: int, move_lists: list) -> int:
+    """Number of leaf nodes of the legal move tree, generated by Position."""
+    moves = move_lists[depth]
+    moves.clear()
+    position.generate_moves(moves)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in list(moves):
+        position.push(move)
+        nodes += perft(position, depth - 1, move_lists)
+        position.pop()
+    return nodes
+
+
+def board_perft(board: chess.Board, depth: int) -> int:
+    """The same count with python-chess."""
+    if depth == 1:
+        return board.legal_moves.count()
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += board_perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def compare_positions(board: chess.Board, position: Position, depth: int) -> Optional[str]:
+    """Walk the tree to depth with python-chess and Position in lockstep and
+    describe the first node where legal moves, check, Zobrist key or material
+    differ, or where pop doesn't restore the position. None if all match."""
+    expected = sorted(encode_move(move) for move in board.legal_moves)
+    moves, captures, quiets = [], [], []
+    position.generate_moves(moves)
+    position.generate_captures(captures)
+    position.generate_quiets(quiets)
+    if sorted(moves) != expected or sorted(captures + quiets) != expected:
+        return f"legal moves differ in {board.fen()}"
+    if position.is_check() != board.is_check():
+        return f"check differs in {board.fen()}"
+    if position.key != chess.polyglot.zobrist_hash(board) or position.zobrist_hash() != position.key:
+        return f"Zobrist key differs in {board.fen()}"
+    if position.material != material_score(board):
+        return f"material differs in {board.fen()}"
+    if depth == 0:
+        return None
+    for move in board.legal_moves:
+        before = position.to_board().fen()
+        board.push(move)
+        position.push(encode_move(move))
+        error = compare_positions(board, position, depth - 1)
+        board.pop()
+        position.pop()
+        if error:
+            return error
+        if position.to_board().fen() != before:
+            return f"pop of {move} doesn't restore {board.fen()}"
+    return None
+
+
+def bench_perft(depth: int) -> int:
+    """Perft node counts of Position against python-chess, with nodes per second.
+    Every node above the leaves is also compared move by move. Returns the
+    number of positions that differ."""
+    print(f"Perft benchmark, depth {depth}")
+    print(f"{'Position':<34}{'nodes':>10}{'expected':>10}{'python-chess n/s':>18}{'Position n/s':>14}")
+    failures = 0
+    for name, fen in {**PERFT_POSITIONS, **TEST_POSITIONS}.items():
+        board = chess.Board(fen)
+        position = Position.from_board(board)
+        error = compare_positions(board, position, depth - 1)
+
+        start = time.perf_counter()
+        expected = board_perft(board, depth)
+        board_rate = expected / (time.perf_counter() - start)
+        start = time.perf_counter()
+        nodes = perft(position, depth, [[] for _ in range(depth + 1)])
+        position_rate = nodes / (time.perf_counter() - start)
+
+        print(f"{name:<34}{nodes:>10}{expected:>10}{board_rate:>18,.0f}{position_rate:>14,.0f}")
+        if error or nodes != expected:
+            failures += 1
+            print(f"  MISMATCH: {error or 'node counts differ'}")
+    print("All positions match" if not failures else f"{failures} positions differ")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MinimaxAI benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    alloc = subparsers.add_parser("alloc", help="allocations per node in the search")
+    alloc.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+
+    search = subparsers.add_parser("search", help="nodes and time to a fixed depth")
+    search.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    search.add_argument("--no-null-move", action="store_true", help="disable null-move pruning")
+    search.add_argument("--no-lmr", action="store_true", help="disable late move reductions")
+    search.add_argument("--no-futility", action="store_true", help="disable futility pruning")
+    search.add_argument("--no-razoring", action="store_true", help="disable razoring")
+    search.add_argument("--eval-cache-mb", type=int, default=4, help="evaluation cache size, 0 disables it")
+    search.add_argument("--check-incremental", action="store_true",
+                        help="verify the incremental material score and Zobrist key against a full recomputation")
+
+    see_parser = subparsers.add_parser("see", help="static exchange evaluations per second")
+    see_parser.add_argument("--playouts", type=int, default=50)
+    see_parser.add_argument("--repeat", type=int, default=20)
+
+    perft_parser = subparsers.add_parser("perft", help="check Position move generation against python-chess")
+    perft_parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+
+    eval_parser = subparsers.add_parser("eval", help="leaf evaluations per second")
+    eval_parser.add_argument("--playouts", type=int, default=50)
+    eval_parser.add_argument("--repeat", type=int, default=20)
+
+    batch_parser = subparsers.add_parser("batch", help="batch evaluations per second")
+    batch_parser.add_argument("--playouts", type=int, default=50)
+    batch_parser.add_argument("--repeat", type=int, default=20)
+
+    nnue_parser = subparsers.add_parser("nnue", help="NNUE accumulator check and nodes per second vs classical")
+    nnue_parser.add_argument("--weights", help="network .npz file (default: random weights)")
+    nnue_parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    nnue_parser.add_argument("--nodes", type=int, default=20000, help="node budget per position")
+    nnue_parser.add_argument("--playouts", type=int, default=20)
+
+    smp_parser = subparsers.add_parser("smp", help="Lazy SMP time to depth by worker count")
+    smp_parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH + 1)
+    smp_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+
+    args = parser.parse_args()
+    # Benchmarks with a correctness check return its number of failures
+    failures = 0
+    if args.benchmark == "alloc":
+        bench_allocations(args.depth)
+    elif args.benchmark == "search":
+        bench_search(args.depth, args.eval_cache_mb, null_move=not args.no_null_move,
+                     late_move_reductions=not args.no_lmr,
+                     futility_pruning=not args.no_futility, razoring=not args.no_razoring,
+                     check_incremental=args.check_incremental)
+    elif args.benchmark == "see":
+        bench_see(args.playouts, args.repeat)
+    elif args.benchmark == "perft":
+        failures = bench_perft(args.depth)
+    elif args.benchmark == "eval":
+        failures = bench_eval(args.playouts, args.repeat)
+    elif args.benchmark == "batch":
+        failures = bench_batch(args.playouts, args.repeat)
+    elif args.benchmark == "nnue":
+        failures = bench_nnue(args.weights, args.depth, args.nodes, args.playouts)
+    elif args.benchmark == "smp":
+        bench_smp(args.depth, args.workers)
+    # A failed check fails the run, so the checks can gate changes
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
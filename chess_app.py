@@ -1,14 +1,16 @@
 import pygame
 import chess
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import sys
-import threading
 import time
 
 from gui.ui_manager import UIManager, GameMode, AIDifficulty
 from gui.game_gui import GameGUI
 from game.board import ChessBoard
-from ai.minimax import MinimaxAI
+from ai.search_worker import SearchWorker
+
+# Moves suggested by the Hint button, best first
+HINT_MOVES = 3
 
 class ChessApp:
     def __init__(self):
@@ -20,11 +22,28 @@ class ChessApp:
         
         # Game state
         self.board = None
-        self.ai_white = None
-        self.ai_black = None
+        # MinimaxAI settings of the AI playing each color, None for a human
+        self.ai_white: Optional[Dict[str, Any]] = None
+        self.ai_black: Optional[Dict[str, Any]] = None
         self.current_game_mode = None
         self.game_running = False
         self.ai_thinking = False
+        # Searches run in a worker process, started once for all games, so
+        # they don't compete with the GUI loop for the GIL
+        self.search_worker = SearchWorker()
+        self._search_id: Optional[int] = None  # Search whose result we wait for
+        self._search_color = chess.WHITE  # Side to move in that search
+        self._pending_ai_move: Optional[chess.Move] = None
+        # The opponent reply the AI expected after its last move
+        self._expected_reply: Optional[chess.Move] = None
+        # Pondering: the human move the current search expects (a null move
+        # when it searches all replies), and its result (move, expected
+        # reply) if it already finished
+        self._ponder_move: Optional[chess.Move] = None
+        self._ponder_result: Optional[Tuple[chess.Move, Optional[chess.Move]]] = None
+        # Hint analysis running in the worker, and the position it is for
+        self._hint_id: Optional[int] = None
+        self._hint_fen: Optional[str] = None
         
         # Settings
         self.settings = self.ui_manager.get_settings()
@@ -35,6 +54,7 @@ class ChessApp:
         
     def start_new_game(self, mode: GameMode):
         """Start a new game with the specified mode."""
+        self._cancel_ai_move()
         self.current_game_mode = mode
         self.board = ChessBoard()
         self.game_gui = GameGUI()
@@ -44,23 +64,28 @@ class ChessApp:
         # Initialize AI based on mode and settings
         ai_depth = self.settings["ai_difficulty"].value[1]
         
+        ai_settings = {"max_depth": ai_depth}
         if mode == GameMode.PLAY_VS_AI:
             if self.settings["player_color"] == chess.WHITE:
                 # Player is white, AI is black
                 self.ai_white = None
-                self.ai_black = MinimaxAI(max_depth=ai_depth, ai_color=chess.BLACK)
+                self.ai_black = ai_settings
             else:
                 # Player is black, AI is white
-                self.ai_white = MinimaxAI(max_depth=ai_depth, ai_color=chess.WHITE)
+                self.ai_white = ai_settings
                 self.ai_black = None
         elif mode == GameMode.AI_VS_AI:
             # Both sides are AI
-            self.ai_white = MinimaxAI(max_depth=ai_depth, ai_color=chess.WHITE)
-            self.ai_black = MinimaxAI(max_depth=ai_depth, ai_color=chess.BLACK)
+            self.ai_white = ai_settings
+            self.ai_black = ai_settings
         else:  # PLAY_VS_PLAYER
             # No AI
             self.ai_white = None
             self.ai_black = None
+        self._expected_reply = None
+        self.search_worker.new_game({color: settings for color, settings
+                                     in ((chess.WHITE, self.ai_white), (chess.BLACK, self.ai_black))
+                                     if settings is not None})
         
         # Set initial status
         if mode == GameMode.PLAY_VS_AI:
@@ -89,8 +114,8 @@ class ChessApp:
         else:
             return self.ai_black is not None
     
-    def get_current_ai(self) -> Optional[MinimaxAI]:
-        """Get the AI for the current turn."""
+    def get_current_ai(self) -> Optional[Dict[str, Any]]:
+        """Get the settings of the AI for the current turn."""
         if not self.board:
             return None
         
@@ -101,33 +126,119 @@ class ChessApp:
             return self.ai_black
     
     def _start_ai_move(self):
-        """Start AI move calculation in a separate thread."""
+        """Start AI move calculation in the search worker."""
         if self.ai_thinking or not self.is_ai_turn():
             return
+        if self._hint_id is not None:
+            # The human moved: the hint is for the old position, and the
+            # worker would finish it before the AI's search
+            self.search_worker.stop(self._hint_id)
+            self._hint_id = None
+        if self._ponder_move is not None:
+            if self._ponder_move == self.board.board.peek():
+                self._ponder_hit()
+                return
+            # Ponder miss: the search was for another position
+            self._cancel_ai_move()
         
         self.ai_thinking = True
-        ai = self.get_current_ai()
-        if ai:
-            # Start AI calculation in background thread
-            thread = threading.Thread(target=self._calculate_ai_move, args=(ai,))
-            thread.daemon = True
-            thread.start()
+        self._search_color = self.board.board.turn
+        self._search_id = self.search_worker.start(self.board.board.copy(), self._search_color)
+    
+    def _start_pondering(self):
+        """Let the AI think on the human's time. It searches the position after
+        the reply it expects, at full depth, so if the human plays that reply
+        the search becomes its answer. Without an expected reply it searches
+        the current position, which fills its transposition table for every
+        reply."""
+        ai_color = not self.board.board.turn
+        ai = self.ai_white if ai_color == chess.WHITE else self.ai_black
+        if not self.settings.get("ponder", True) or ai is None or self._search_id is not None:
+            return
+        board = self.board.board.copy()
+        expected = self._expected_reply
+        if expected is not None and board.is_legal(expected):
+            board.push(expected)
+            self._ponder_move = expected
+        else:
+            self._ponder_move = chess.Move.null()  # Matches no reply
+        # The side to move in the searched position, for the evaluation bar
+        self._search_color = board.turn
+        self._search_id = self.search_worker.start(board, ai_color)
     
-    def _calculate_ai_move(self, ai: MinimaxAI):
-        """Calculate AI move in background thread."""
-        try:
-            move = ai.find_best_move(self.board.board)
-            if move and self.game_running:
-                # Schedule move to be applied in main thread
-                self._pending_ai_move = move
-        except Exception as e:
-            print(f"AI calculation error: {e}")
-        finally:
-            self.ai_thinking = False
+    def _ponder_hit(self):
+        """The human played the expected reply: the ponder search becomes the
+        AI's search, or its result the AI's move if it already finished."""
+        self._ponder_move = None
+        if self._ponder_result is not None:
+            self._pending_ai_move, self._expected_reply = self._ponder_result
+            self._ponder_result = None
+            self._search_id = None
+        else:
+            self.ai_thinking = True
+    
+    def _handle_search_messages(self):
+        """Act on the search worker's messages. Those of cancelled searches
+        are dropped."""
+        for message in self.search_worker.poll():
+            kind, search_id = message[:2]
+            if search_id == self._hint_id:
+                self._handle_hint_message(message)
+                continue
+            if search_id != self._search_id:
+                continue
+            if kind == "info":
+                self.game_gui.set_analysis(message[2], self._search_color)
+            elif kind == "bestmove":
+                move, expected_reply = message[2:]
+                if self._ponder_move is not None:
+                    # Pondered to full depth before the human moved; kept for a ponder hit
+                    self._ponder_result = (move, expected_reply)
+                    continue
+                self._search_id = None
+                self.ai_thinking = False
+                if move and self.game_running:
+                    self._pending_ai_move = move
+                    self._expected_reply = expected_reply
+            elif kind == "error":
+                print(f"AI calculation error: {message[2]}")
+                self._search_id = None
+                self.ai_thinking = False
+                self._ponder_move = None
+    
+    def _handle_hint_message(self, message: tuple):
+        """Show the hint analysis' lines, unless the position changed meanwhile."""
+        kind = message[0]
+        self._hint_id = None
+        if kind == "lines":
+            lines = message[2]
+            if lines and self.board and self.board.board.fen() == self._hint_fen:
+                hints = ", ".join(f"{line.move} ({line.score / 100:+.2f})" for line in lines)
+                self.game_gui.set_status(f"Hint: {hints}")
+                self._start_pondering()
+        elif kind == "error":
+            print(f"AI hint error: {message[2]}")
+    
+    def _cancel_ai_move(self):
+        """Stop the running AI search, if any, and drop its result. Called
+        whenever the position changes under the search."""
+        if self._search_id is not None:
+            # The worker sends the stopped search's result within
+            # milliseconds; it is ignored since it no longer matches
+            self.search_worker.stop(self._search_id)
+            self._search_id = None
+        if self._hint_id is not None:
+            # The hint is for the old position too, and would delay the next search
+            self.search_worker.stop(self._hint_id)
+            self._hint_id = None
+        self.ai_thinking = False
+        self._pending_ai_move = None
+        self._ponder_move = None
+        self._ponder_result = None
     
     def _apply_pending_ai_move(self):
         """Apply pending AI move if available."""
-        if hasattr(self, '_pending_ai_move') and self._pending_ai_move:
+        if self._pending_ai_move:
             move = self._pending_ai_move
             self._pending_ai_move = None
             
@@ -148,6 +259,7 @@ class ChessApp:
                 self._start_ai_move()
             else:
                 self.game_gui.set_status("Your turn")
+                self._start_pondering()
     
     def handle_game_click(self, pos):
         """Handle clicks during game mode."""
@@ -172,6 +284,7 @@ class ChessApp:
                 
                 # Update status
                 if self.board.is_game_over():
+                    self._cancel_ai_move()
                     result = self.game_gui.get_game_result(self.board.board)
                     self.game_gui.set_status(f"Game Over: {result}")
                     self.game_running = False
@@ -190,6 +303,7 @@ class ChessApp:
                 self.start_new_game(self.current_game_mode)
         elif action == "undo":
             if self.board and self.board.board.move_stack:
+                self._cancel_ai_move()
                 # Undo last move(s)
                 if self.current_game_mode == GameMode.PLAY_VS_AI:
                     # Undo both player and AI moves
@@ -207,6 +321,8 @@ class ChessApp:
                     self.game_gui.set_last_move(self.board.board.move_stack[-1])
                 else:
                     self.game_gui.set_last_move(None)
+                # The analysis was of a position no longer on the board
+                self.game_gui.set_analysis(None)
                 
                 # Update status
                 if self.is_ai_turn() and self.current_game_mode != GameMode.PLAY_VS_PLAYER:
@@ -216,17 +332,23 @@ class ChessApp:
                     turn_color = "White" if self.board.board.turn == chess.WHITE else "Black"
                     self.game_gui.set_status(f"{turn_color} to move")
         elif action == "hint":
-            if (self.board and not self.ai_thinking and 
+            if (self.board and not self.ai_thinking and self._hint_id is None and
                 not self.is_ai_turn() and self.current_game_mode == GameMode.PLAY_VS_AI):
-                # Get hint from AI
+                # Get hint from AI: its best moves, with their scores, from one
+                # search in the worker, so the board stays responsive
                 ai_depth = max(2, self.settings["ai_difficulty"].value[1] - 1)
-                hint_ai = MinimaxAI(max_depth=ai_depth, ai_color=self.board.board.turn)
-                hint_move = hint_ai.find_best_move(self.board.board)
-                if hint_move:
-                    self.game_gui.set_status(f"Hint: {hint_move}")
+                if self._ponder_move is not None and self._ponder_result is None:
+                    # The worker runs one search at a time: don't make the
+                    # hint wait for the ponder search, restart it afterwards
+                    self._cancel_ai_move()
+                self._hint_fen = self.board.board.fen()
+                self._hint_id = self.search_worker.analyse(self.board.board.copy(), {"max_depth": ai_depth},
+                                                           HINT_MOVES)
+                self.game_gui.set_status("Looking for a hint...")
         elif action == "settings":
             self.ui_manager.set_mode(GameMode.SETTINGS)
         elif action == "main_menu":
+            self._cancel_ai_move()
             self.ui_manager.set_mode(GameMode.MENU)
             self.game_running = False
     
@@ -234,6 +356,7 @@ class ChessApp:
         """Handle all pygame events."""
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                self._cancel_ai_move()
                 self.running = False
                 return
             
@@ -245,6 +368,7 @@ class ChessApp:
                     self.handle_game_click(event.pos)
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:
+                        self._cancel_ai_move()
                         self.ui_manager.set_mode(GameMode.MENU)
                         self.game_running = False
                     elif event.key == pygame.K_n:
@@ -269,8 +393,8 @@ class ChessApp:
     def update(self):
         """Update game state."""
         # Apply pending AI moves
-        if hasattr(self, '_pending_ai_move'):
-            self._apply_pending_ai_move()
+        self._handle_search_messages()
+        self._apply_pending_ai_move()
         
         # Update settings
         self.settings = self.ui_manager.get_settings()
@@ -310,6 +434,7 @@ class ChessApp:
             self.draw()
             self.clock.tick(60)  # 60 FPS
         
+        self.search_worker.close()
         pygame.quit()
         sys.exit()
 
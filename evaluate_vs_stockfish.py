@@ -8,7 +8,10 @@ from game.move_generator import evaluate_board # Assuming evaluate_board is in g
 # --- Configuration ---
 STOCKFISH_PATH = "stockfish-windows-x86-64-avx2.exe" # Make sure this is in your project root or provide full path
 MINIMAX_DEPTH = 4  # Depth for your Minimax AI
+MINIMAX_NULL_MOVE = True  # Null-move pruning, switch off to measure its effect
+MINIMAX_LMR = True  # Late move reductions
 STOCKFISH_THINK_TIME = 0.5  # Seconds for Stockfish to think
+MULTI_PV = 3  # Top moves compared between Minimax and Stockfish
 
 # A list of FEN strings for testing
 TEST_POSITIONS = {
@@ -20,13 +23,17 @@ TEST_POSITIONS = {
     "Black to Play Tactical Position": "2r2rk1/pp1b1pp1/1q2pn1p/3p4/3P4/P1NBP3/1P2NPPP/R2Q1RK1 b - - 0 15"
 }
 
-def get_minimax_analysis(board: chess.Board, depth: int):
-    """Analyzes the position using your Minimax AI."""
+def get_minimax_analysis(board: chess.Board, depth: int, multi_pv: int = 1):
+    """Analyzes the position using your Minimax AI.
+
+    Returns the static evaluation and the top multi_pv moves with their
+    search scores, best first, from a single Multi-PV search.
+    """
     if board.is_game_over():
-        return evaluate_board(board, board.turn), None
+        return evaluate_board(board, board.turn), []
 
     # MinimaxAI's find_best_move internally sets ai_color based on board.turn
-    ai = MinimaxAI(max_depth=depth) 
+    ai = MinimaxAI(max_depth=depth, null_move=MINIMAX_NULL_MOVE, late_move_reductions=MINIMAX_LMR)
     
     # Get evaluation from the current player's perspective
     # Note: MinimaxAI's evaluate_board is used inside find_best_move.
@@ -34,29 +41,35 @@ def get_minimax_analysis(board: chess.Board, depth: int):
     # we call evaluate_board directly.
     current_player_eval = evaluate_board(board, board.turn)
     
-    best_move = ai.find_best_move(board) # This also prints nodes evaluated
+    lines = ai.analyse(board, multi_pv) # This also prints nodes evaluated
     
-    return current_player_eval, best_move
+    return current_player_eval, [(line.move, line.score) for line in lines]
+
+def get_stockfish_analysis(board: chess.Board, think_time: float, multi_pv: int = 1):
+    """Analyzes the position using Stockfish.
 
-def get_stockfish_analysis(board: chess.Board, think_time: float):
-    """Analyzes the position using Stockfish."""
+    Returns the score, the best move and the top multi_pv moves with their
+    scores, best first, from a single engine session.
+    """
     try:
         with chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH) as engine:
-            result = engine.analyse(board, chess.engine.Limit(time=think_time))
-            # Score is from the current player's perspective (relative)
+            infos = engine.analyse(board, chess.engine.Limit(time=think_time), multipv=multi_pv)
+            # Scores are from the current player's perspective (relative)
             # Mate scores are converted to large centipawn values
-            score = result["score"].relative.score(mate_score=100000) 
-            pv = result.get("pv")
-            best_move = pv[0] if pv else None
-            return score, best_move
+            lines = [(info["pv"][0], info["score"].relative.score(mate_score=100000))
+                     for info in infos if info.get("pv")]
+            score = infos[0]["score"].relative.score(mate_score=100000) if infos else None
+            best_move = lines[0][0] if lines else None
+            return score, best_move, lines
     except Exception as e:
         print(f"Stockfish Error: {e}")
-        return None, None
+        return None, None, []
 
 def main():
     print("♔ Chess AI Master - Minimax vs Stockfish Evaluation ♔")
     print(f"Using Stockfish: {STOCKFISH_PATH}")
     print(f"Minimax Depth: {MINIMAX_DEPTH}")
+    print(f"Null-move pruning: {MINIMAX_NULL_MOVE}, Late move reductions: {MINIMAX_LMR}")
     print(f"Stockfish Think Time: {STOCKFISH_THINK_TIME}s per position\n")
 
     for name, fen in TEST_POSITIONS.items():
@@ -70,26 +83,30 @@ def main():
         # Minimax Analysis
         print("\nMinimax Analysis:")
         minimax_calc_start_time = time.time()
-        # Hàm get_minimax_analysis vẫn được gọi để lấy nước đi của Minimax.
+        # Một lần tìm kiếm Multi-PV cho cả nước đi của Minimax và bảng xếp hạng nước đi.
         # Điểm minimax_heuristic_score gốc từ evaluate_board() sẽ không được hiển thị trực tiếp nữa.
-        _, minimax_chosen_move = get_minimax_analysis(board.copy(), MINIMAX_DEPTH)
+        _, minimax_lines = get_minimax_analysis(board.copy(), MINIMAX_DEPTH, MULTI_PV)
         minimax_calc_time = time.time() - minimax_calc_start_time
+        minimax_chosen_move = minimax_lines[0][0] if minimax_lines else None
 
-        # Đánh giá thế cờ HIỆN TẠI (trước nước đi của Minimax) bằng Stockfish
-        # Điểm này sẽ được hiển thị thay cho điểm heuristic của Minimax.
-        stockfish_score_of_current_pos, _ = get_stockfish_analysis(board.copy(), STOCKFISH_THINK_TIME)
+        # Stockfish được chạy một lần cho mỗi thế cờ (multipv): điểm của thế cờ HIỆN TẠI,
+        # nước đi Stockfish chọn và bảng xếp hạng nước đi đều lấy từ lần phân tích này.
+        stockfish_analysis_start_time = time.time()
+        stockfish_score, stockfish_chosen_move, stockfish_lines = get_stockfish_analysis(
+            board.copy(), STOCKFISH_THINK_TIME, MULTI_PV)
+        stockfish_analysis_time = time.time() - stockfish_analysis_start_time
 
         if minimax_chosen_move:
-            print(f"  Best Move (chosen by Minimax): {minimax_chosen_move.uci()}")
-            if stockfish_score_of_current_pos is not None:
-                print(f"  Stockfish Score (of this pos, cp): {stockfish_score_of_current_pos}")
+            print(f"  Best Move (chosen by Minimax): {minimax_chosen_move.uci()} (score {minimax_lines[0][1]:+d})")
+            if stockfish_score is not None:
+                print(f"  Stockfish Score (of this pos, cp): {stockfish_score}")
             else:
                 print(f"  Stockfish Score (of this pos, cp): N/A (Stockfish error)")
         else:
             # Nếu Minimax không tìm thấy nước đi (game over), hiển thị đánh giá của Stockfish cho thế cờ cuối cùng này.
             print("  No move found by Minimax (game is over).")
-            if stockfish_score_of_current_pos is not None:
-                print(f"  Stockfish Score (of terminal pos, cp): {stockfish_score_of_current_pos}")
+            if stockfish_score is not None:
+                print(f"  Stockfish Score (of terminal pos, cp): {stockfish_score}")
             else:
                 print(f"  Stockfish Score (of terminal pos, cp): N/A (Stockfish error)")
         
@@ -97,18 +114,28 @@ def main():
 
         # Stockfish Analysis (phần này giữ nguyên cho mục đích so sánh nước đi Stockfish chọn)
         print("\nStockfish Analysis:")
-        stockfish_analysis_start_time = time.time()
-        stockfish_score_for_its_section, stockfish_chosen_move = get_stockfish_analysis(board.copy(), STOCKFISH_THINK_TIME)
-        stockfish_analysis_time = time.time() - stockfish_analysis_start_time
         if stockfish_chosen_move:
             print(f"  Best Move (chosen by Stockfish): {stockfish_chosen_move.uci()}")
-            print(f"  Stockfish Score (cp, from current player): {stockfish_score_for_its_section}")
-        elif stockfish_score_for_its_section is not None: 
-             print(f"  Score (cp, from current player): {stockfish_score_for_its_section}")
+            print(f"  Stockfish Score (cp, from current player): {stockfish_score}")
+        elif stockfish_score is not None: 
+             print(f"  Score (cp, from current player): {stockfish_score}")
              print(f"  No best move suggested by Stockfish (likely game over or drawn position).")
         else:
             print("  Stockfish-only analysis failed.")
         print(f"  Stockfish Analysis Time: {stockfish_analysis_time:.4f}s")
+
+        # Move ranking: Minimax's top moves against Stockfish's
+        if not board.is_game_over():
+            print(f"\nTop {MULTI_PV} Moves:")
+            for rank in range(max(len(minimax_lines), len(stockfish_lines))):
+                minimax_text = (f"{minimax_lines[rank][0].uci()} ({minimax_lines[rank][1]:+d})"
+                                if rank < len(minimax_lines) else "-")
+                stockfish_text = (f"{stockfish_lines[rank][0].uci()} ({stockfish_lines[rank][1]:+d})"
+                                  if rank < len(stockfish_lines) else "-")
+                print(f"  {rank + 1}. Minimax: {minimax_text:<16} Stockfish: {stockfish_text}")
+            stockfish_moves = {move for move, _ in stockfish_lines}
+            shared = sum(1 for move, _ in minimax_lines if move in stockfish_moves)
+            print(f"  Minimax top moves also in Stockfish's top {MULTI_PV}: {shared}/{len(minimax_lines)}")
         
         print("-" * 40 + "\n")
 
@@ -0,0 +1,254 @@
+import chess
+import numpy as np
+from typing import Iterable, Optional, Tuple, Union
+
+from game.move_generator import (PIECE_SQUARE_SCORES, MOBILITY_WEIGHT, PASSED_PAWN_BONUS,
+                                 ISOLATED_PAWN_PENALTY, DOUBLED_PAWN_PENALTY, PASSED_PAWN_MASKS,
+                                 evaluate_board)
+
+# Vectorized versions of the evaluation in game/move_generator.py, for tuning
+# and labeling many positions at once. Positions are encoded as 12 piece
+# bitboards: White pawn, knight, bishop, rook, queen, king, then Black's.
+# evaluate_encoded matches evaluate_position and evaluate_boards matches
+# evaluate_board, score for score.
+
+# Positions evaluated per chunk, to bound the size of the temporary arrays
+CHUNK_SIZE = 8192
+
+_WHITE_PLANES = slice(0, 6)
+_BLACK_PLANES = slice(6, 12)
+
+# Material and piece-square weights per plane and square, from White's side
+PIECE_SQUARE_WEIGHTS = np.array(
+    [PIECE_SQUARE_SCORES[chess.WHITE][piece_type] for piece_type in chess.PIECE_TYPES]
+    + [[-score for score in PIECE_SQUARE_SCORES[chess.BLACK][piece_type]] for piece_type in chess.PIECE_TYPES],
+    dtype=np.int64)
+
+# Passed pawn masks and bonuses per square, by [color]
+_PASSED_MASKS = [np.array(PASSED_PAWN_MASKS[color], dtype=np.uint64) for color in (chess.BLACK, chess.WHITE)]
+_PASSED_BONUSES = [np.array([PASSED_PAWN_BONUS[square >> 3 if color == chess.WHITE else 7 - (square >> 3)]
+                             for square in chess.SQUARES], dtype=np.int64)
+                   for color in (chess.BLACK, chess.WHITE)]
+
+_NOT_A = np.uint64(chess.BB_ALL & ~chess.BB_FILE_A)
+_NOT_H = np.uint64(chess.BB_ALL & ~chess.BB_FILE_H)
+_NOT_AB = np.uint64(chess.BB_ALL & ~(chess.BB_FILE_A | chess.BB_FILE_B))
+_NOT_GH = np.uint64(chess.BB_ALL & ~(chess.BB_FILE_G | chess.BB_FILE_H))
+_ALL = np.uint64(chess.BB_ALL)
+
+# Sliding directions as (shift, mask of squares that can be reached without
+# wrapping around the board); positive shifts move towards the 8th rank
+_DIAGONAL_DIRECTIONS = ((9, _NOT_A), (7, _NOT_H), (-7, _NOT_A), (-9, _NOT_H))
+_STRAIGHT_DIRECTIONS = ((8, _ALL), (-8, _ALL), (1, _NOT_A), (-1, _NOT_H))
+_KNIGHT_JUMPS = ((17, _NOT_A), (15, _NOT_H), (10, _NOT_AB), (6, _NOT_GH),
+                 (-6, _NOT_AB), (-10, _NOT_GH), (-15, _NOT_A), (-17, _NOT_H))
+_KING_STEPS = _DIAGONAL_DIRECTIONS + _STRAIGHT_DIRECTIONS
+# Pawn captures by [color of the pawn]
+_PAWN_CAPTURES = (((-7, _NOT_A), (-9, _NOT_H)), ((9, _NOT_A), (7, _NOT_H)))
+
+# Plane of each FEN piece letter, and squares skipped by each FEN digit
+_FEN_PLANES = {symbol: plane for plane, symbol in enumerate("PNBRQKpnbrqk")}
+_FEN_SKIPS = {str(count): count for count in range(1, 9)}
+
+BoardOrFen = Union[chess.Board, str]
+
+
+def encode_boards(boards: Iterable[BoardOrFen]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode boards (or FENs) as an (N, 12) uint64 array of piece bitboards and
+    an (N,) bool array of the side to move.
+
+    FENs are read directly, several times faster than building a chess.Board:
+    only the piece placement and side to move are used, and only their
+    syntax is checked.
+    """
+    rows = []
+    turns = []
+    for board in boards:
+        if isinstance(board, str):
+            row, turn = _encode_fen(board)
+            rows.append(row)
+            turns.append(turn)
+            continue
+        white = board.occupied_co[chess.WHITE]
+        black = board.occupied_co[chess.BLACK]
+        pieces = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+        rows.append([mask & white for mask in pieces] + [mask & black for mask in pieces])
+        turns.append(board.turn)
+    return np.array(rows, dtype=np.uint64).reshape(-1, 12), np.array(turns, dtype=bool)
+
+
+def _encode_fen(fen: str) -> Tuple[list, bool]:
+    """Piece bitboards and side to move of a FEN, in encode_boards' order."""
+    fields = fen.split()
+    ranks = fields[0].split("/") if fields else []
+    if len(ranks) != 8:
+        raise ValueError(f"expected 8 ranks in FEN: {fen!r}")
+    row = [0] * 12
+    for rank_index, rank in enumerate(ranks):
+        square = (7 - rank_index) * 8
+        end = square + 8
+        for symbol in rank:
+            plane = _FEN_PLANES.get(symbol)
+            if plane is not None and square < end:
+                row[plane] |= 1 << square
+                square += 1
+            elif symbol in _FEN_SKIPS:
+                square += _FEN_SKIPS[symbol]
+            else:
+                raise ValueError(f"invalid piece placement in FEN: {fen!r}")
+        if square != end:
+            raise ValueError(f"invalid piece placement in FEN: {fen!r}")
+    if len(fields) > 1 and fields[1] not in ("w", "b"):
+        raise ValueError(f"invalid side to move in FEN: {fen!r}")
+    return row, len(fields) < 2 or fields[1] == "w"
+
+
+def piece_planes(bitboards: np.ndarray) -> np.ndarray:
+    """Expand (N, 12) piece bitboards into (N, 12, 64) 0/1 piece planes."""
+    as_bytes = bitboards.astype('<u8').view(np.uint8).reshape(len(bitboards), 12, 8)
+    return np.unpackbits(as_bytes, axis=2, bitorder='little')
+
+
+def evaluate_encoded(bitboards: np.ndarray, turns: np.ndarray,
+                     for_color: Optional[chess.Color] = None) -> np.ndarray:
+    """evaluate_position for every encoded position, as an (N,) int64 array.
+
+    Scores are from the side to move's perspective, or for_color's if given.
+    """
+    scores = np.empty(len(bitboards), dtype=np.int64)
+    for start in range(0, len(bitboards), CHUNK_SIZE):
+        chunk = bitboards[start:start + CHUNK_SIZE]
+        scores[start:start + CHUNK_SIZE] = _white_scores(chunk)
+    perspective = turns if for_color is None else np.full(len(bitboards), for_color, dtype=bool)
+    return np.where(perspective, scores, -scores)
+
+
+def evaluate_boards(boards: Iterable[BoardOrFen], for_color: Optional[chess.Color] = None) -> np.ndarray:
+    """evaluate_board for every board (or FEN), as an (N,) int64 array.
+
+    Checkmate, stalemate and insufficient material are detected board by
+    board, like evaluate_board does, but only where a batch test can't rule
+    them out: when the side to move has no safe king step, or there are no
+    pawns, rooks or queens. That is a few percent of typical positions.
+    """
+    boards = list(boards)
+    bitboards, turns = encode_boards(boards)
+    scores = evaluate_encoded(bitboards, turns, for_color)
+    heavy_pieces = np.bitwise_or.reduce(bitboards[:, [0, 3, 4, 6, 9, 10]], axis=1)
+    ruled_out = _king_can_step(bitboards, turns) & (heavy_pieces != 0)
+    for i in np.flatnonzero(~ruled_out):
+        board = boards[i]
+        if isinstance(board, str):
+            board = chess.Board(board)
+        if board.is_insufficient_material() or not any(board.generate_legal_moves()):
+            scores[i] = evaluate_board(board, for_color)
+    return scores
+
+
+def _king_can_step(bitboards: np.ndarray, turns: np.ndarray) -> np.ndarray:
+    """Whether the side to move's king has a legal step to a neighbouring
+    square, so the side has a legal move. Castling is ignored; a position
+    without it just isn't ruled out."""
+    us = np.where(turns[:, None], bitboards[:, _WHITE_PLANES], bitboards[:, _BLACK_PLANES])
+    them = np.where(turns[:, None], bitboards[:, _BLACK_PLANES], bitboards[:, _WHITE_PLANES])
+    own = np.bitwise_or.reduce(us, axis=1)
+    king = us[:, 5]
+    # Sliders see through our king, so it can't step back along their ray
+    empty = ~((own ^ king) | np.bitwise_or.reduce(them, axis=1))
+
+    attacked = np.zeros(len(bitboards), dtype=np.uint64)
+    for amount, mask in _KNIGHT_JUMPS:
+        attacked |= _shift(them[:, 1], amount) & mask
+    for amount, mask in _KING_STEPS:
+        attacked |= _shift(them[:, 5], amount) & mask
+    # Pawns capture towards their opponent: ours is the side to move
+    for color in (chess.BLACK, chess.WHITE):
+        pawn_attacks = np.zeros(len(bitboards), dtype=np.uint64)
+        for amount, mask in _PAWN_CAPTURES[color]:
+            pawn_attacks |= _shift(them[:, 0], amount) & mask
+        attacked |= np.where(turns == (color == chess.BLACK), pawn_attacks, np.uint64(0))
+    queens = them[:, 4]
+    for sliders, directions in ((them[:, 2] | queens, _DIAGONAL_DIRECTIONS),
+                                (them[:, 3] | queens, _STRAIGHT_DIRECTIONS)):
+        for amount, mask in directions:
+            attacked |= _slide(sliders, empty, amount, mask)
+
+    steps = np.zeros(len(bitboards), dtype=np.uint64)
+    for amount, mask in _KING_STEPS:
+        steps |= _shift(king, amount) & mask
+    return (steps & ~own & ~attacked) != 0
+
+
+def _white_scores(bitboards: np.ndarray) -> np.ndarray:
+    """Material, piece-square, mobility and pawn structure score from White's side."""
+    planes = piece_planes(bitboards)
+    n = len(bitboards)
+    score = planes.reshape(n, 768) @ PIECE_SQUARE_WEIGHTS.reshape(768)
+
+    white = np.bitwise_or.reduce(bitboards[:, _WHITE_PLANES], axis=1)
+    black = np.bitwise_or.reduce(bitboards[:, _BLACK_PLANES], axis=1)
+    empty = ~(white | black)
+    score += MOBILITY_WEIGHT * (_mobility(bitboards[:, _WHITE_PLANES], white, empty)
+                                - _mobility(bitboards[:, _BLACK_PLANES], black, empty))
+
+    score += (_pawn_structure(planes[:, 0], bitboards[:, 6], chess.WHITE)
+              - _pawn_structure(planes[:, 6], bitboards[:, 0], chess.BLACK))
+    return score
+
+
+def _shift(bb: np.ndarray, amount: int) -> np.ndarray:
+    return bb << np.uint64(amount) if amount > 0 else bb >> np.uint64(-amount)
+
+
+def _mobility(pieces: np.ndarray, own: np.ndarray, empty: np.ndarray) -> np.ndarray:
+    """Attacked squares not occupied by own pieces, summed over knights,
+    bishops, rooks and queens, like _side_mobility.
+
+    Knights are counted jump by jump: each jump moves every knight to a
+    different square. Sliders are counted direction by direction: a ray stops
+    at the first occupied square, so rays of different pieces in the same
+    direction never overlap, and the popcount of their union is the sum.
+    """
+    targets = ~own
+    count = np.zeros(len(pieces), dtype=np.int64)
+
+    knights = pieces[:, 1]
+    for amount, mask in _KNIGHT_JUMPS:
+        count += np.bitwise_count(_shift(knights, amount) & mask & targets)
+
+    queens = pieces[:, 4]
+    for sliders, directions in ((pieces[:, 2] | queens, _DIAGONAL_DIRECTIONS),
+                                (pieces[:, 3] | queens, _STRAIGHT_DIRECTIONS)):
+        for amount, mask in directions:
+            count += np.bitwise_count(_slide(sliders, empty, amount, mask) & targets)
+    return count
+
+
+def _slide(sliders: np.ndarray, empty: np.ndarray, amount: int, mask: np.uint64) -> np.ndarray:
+    """Squares the sliders attack in one direction, up to and including the
+    first occupied square."""
+    # Kogge-Stone occluded fill through empty squares
+    fill = sliders
+    free = empty & mask
+    fill = fill | (free & _shift(fill, amount))
+    free = free & _shift(free, amount)
+    fill = fill | (free & _shift(fill, 2 * amount))
+    free = free & _shift(free, 2 * amount)
+    fill = fill | (free & _shift(fill, 4 * amount))
+    return _shift(fill, amount) & mask
+
+
+def _pawn_structure(own_planes: np.ndarray, enemy: np.ndarray, color: chess.Color) -> np.ndarray:
+    """Passed, isolated and doubled pawn score of one side, like _side_pawn_structure."""
+    n = len(own_planes)
+    file_counts = own_planes.reshape(n, 8, 8).sum(axis=1, dtype=np.int64)
+    occupied_files = file_counts > 0
+    neighbours = np.zeros_like(occupied_files)
+    neighbours[:, 1:] |= occupied_files[:, :-1]
+    neighbours[:, :-1] |= occupied_files[:, 1:]
+
+    score = -DOUBLED_PAWN_PENALTY * np.maximum(file_counts - 1, 0).sum(axis=1)
+    score -= ISOLATED_PAWN_PENALTY * (file_counts * ~neighbours).sum(axis=1)
+    passed = own_planes.astype(bool) & ((enemy[:, None] & _PASSED_MASKS[color][None, :]) == 0)
+    score += passed @ _PASSED_BONUSES[color]
+    return score
@@ -87,6 +87,39 @@ PIECE_TABLES = {
     chess.KING: KING_TABLE
 }
 
+# Bonus per square attacked by a knight, bishop, rook or queen that is not
+# occupied by a piece of its own side
+MOBILITY_WEIGHT = 5
+
+# Piece value plus table bonus, indexed [color][piece_type][square]. The tables
+# are written from Black's side, so White looks them up on the mirrored square.
+PIECE_SQUARE_SCORES = [
+    [None] + [[PIECE_VALUES[piece_type] + PIECE_TABLES[piece_type][
+        square if color == chess.BLACK else chess.square_mirror(square)]
+        for square in chess.SQUARES] for piece_type in chess.PIECE_TYPES]
+    for color in (chess.BLACK, chess.WHITE)
+]
+
+# Pawn structure, from each side's own point of view. Passed pawn bonuses are
+# indexed by the rank counted from the pawn's own side.
+PASSED_PAWN_BONUS = [0, 5, 10, 20, 35, 60, 100, 0]
+ISOLATED_PAWN_PENALTY = 15  # Per pawn with no friendly pawn on a neighbouring file
+DOUBLED_PAWN_PENALTY = 10  # Per extra pawn on a file
+
+# Files next to each file
+_ADJACENT_FILES = [(chess.BB_FILES[file - 1] if file > 0 else 0)
+                   | (chess.BB_FILES[file + 1] if file < 7 else 0) for file in range(8)]
+
+# Squares in front of a pawn on its own and the neighbouring files, by
+# [color][square]. A pawn with no enemy pawns there is passed.
+PASSED_PAWN_MASKS = [
+    [(chess.BB_FILES[chess.square_file(square)] | _ADJACENT_FILES[chess.square_file(square)])
+     & ((chess.BB_ALL << (8 * (chess.square_rank(square) + 1))) & chess.BB_ALL if color == chess.WHITE
+        else (1 << (8 * chess.square_rank(square))) - 1)
+     for square in chess.SQUARES]
+    for color in (chess.BLACK, chess.WHITE)
+]
+
 def evaluate_board(board: chess.Board, for_color: chess.Color = None) -> float:
     """Evaluate the current board position from the specified color's perspective.
     If for_color is None, evaluates from the current player's perspective.
@@ -105,34 +138,109 @@ def evaluate_board(board: chess.Board, for_color: chess.Color = None) -> float:
     if board.is_stalemate() or board.is_insufficient_material():
         return 0
 
-    # Calculate score from the specified color's perspective
+    return evaluate_position(board, for_color)
+
+def evaluate_position(board: chess.Board, for_color: chess.Color = None) -> float:
+    """Evaluate material, piece placement and mobility without checking for the
+    end of the game. The search detects mate, stalemate and draws itself and
+    keeps the material score up to date move by move; use evaluate_board
+    everywhere else.
+
+    Everything comes from the piece bitboards. Mobility is the number of
+    squares each knight, bishop, rook and queen attacks that are not occupied
+    by its own side, counted for both sides, so the score does not depend on
+    whose turn it is.
+    """
+    if for_color is None:
+        for_color = board.turn
+
+    pawns = board.pawns
+    score = (material_score(board) + mobility_score(board)
+             + pawn_structure_score(pawns & board.occupied_co[chess.WHITE],
+                                    pawns & board.occupied_co[chess.BLACK]))
+    return score if for_color == chess.WHITE else -score
+
+def material_score(board: chess.Board) -> int:
+    """Material and piece-square score from White's perspective. The search's
+    Position keeps it up to date move by move."""
+    white = board.occupied_co[chess.WHITE]
+    white_scores = PIECE_SQUARE_SCORES[chess.WHITE]
+    black_scores = PIECE_SQUARE_SCORES[chess.BLACK]
     score = 0
-    
-    # Material and positional evaluation
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece is not None:
-            value = PIECE_VALUES[piece.piece_type]
-            table = PIECE_TABLES[piece.piece_type]
-            
-            # Use appropriate table index based on piece color
-            table_index = square if piece.color == chess.BLACK else chess.square_mirror(square)
-            piece_score = value + table[table_index]
-            
-            # Add or subtract based on piece color relative to for_color
-            if piece.color == for_color:
-                score += piece_score
+    for piece_type, pieces in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                               (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                               (chess.QUEEN, board.queens), (chess.KING, board.kings)):
+        white_table = white_scores[piece_type]
+        black_table = black_scores[piece_type]
+        while pieces:
+            bit = pieces & -pieces
+            if bit & white:
+                score += white_table[bit.bit_length() - 1]
             else:
-                score -= piece_score
+                score -= black_table[bit.bit_length() - 1]
+            pieces ^= bit
+    return score
 
-    # Mobility evaluation
-    # Calculate mobility for the current player
-    mobility_score = len(list(board.legal_moves)) * 10
-    
-    # Add mobility bonus/penalty based on whose turn it is
-    if board.turn == for_color:
-        score += mobility_score 
-    else:
-        score -= mobility_score
+def mobility_score(board: chess.Board) -> int:
+    """Mobility score from White's perspective."""
+    return _side_mobility(board, chess.WHITE) - _side_mobility(board, chess.BLACK)
+
+def _side_mobility(board: chess.Board, color: chess.Color) -> int:
+    """Squares attacked by one side's knights, bishops, rooks and queens that are
+    not occupied by its own pieces, times MOBILITY_WEIGHT."""
+    own = board.occupied_co[color]
+    occupied = board.occupied
+    targets = ~own & chess.BB_ALL
+    popcount = chess.popcount
+    count = 0
+
+    pieces = board.knights & own
+    while pieces:
+        bit = pieces & -pieces
+        count += popcount(chess.BB_KNIGHT_ATTACKS[bit.bit_length() - 1] & targets)
+        pieces ^= bit
 
-    return score 
\ No newline at end of file
+    diagonal = board.bishops | board.queens
+    straight = board.rooks | board.queens
+    pieces = (diagonal | straight) & own
+    while pieces:
+        bit = pieces & -pieces
+        square = bit.bit_length() - 1
+        attacks = 0
+        if bit & diagonal:
+            attacks = chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
+        if bit & straight:
+            attacks |= (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied]
+                        | chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied])
+        count += popcount(attacks & targets)
+        pieces ^= bit
+
+    return count * MOBILITY_WEIGHT
+
+def pawn_structure_score(white_pawns: int, black_pawns: int) -> int:
+    """Passed, isolated and doubled pawn score from White's perspective.
+
+    It depends on nothing but the two pawn bitboards, so the search caches it
+    by a pawn-only hash key.
+    """
+    return (_side_pawn_structure(white_pawns, black_pawns, chess.WHITE)
+            - _side_pawn_structure(black_pawns, white_pawns, chess.BLACK))
+
+def _side_pawn_structure(own: int, enemy: int, color: chess.Color) -> int:
+    passed_masks = PASSED_PAWN_MASKS[color]
+    score = 0
+    pawns = own
+    while pawns:
+        bit = pawns & -pawns
+        square = bit.bit_length() - 1
+        if not passed_masks[square] & enemy:
+            rank = square >> 3
+            score += PASSED_PAWN_BONUS[rank if color == chess.WHITE else 7 - rank]
+        if not _ADJACENT_FILES[square & 7] & own:
+            score -= ISOLATED_PAWN_PENALTY
+        pawns ^= bit
+    for file_mask in chess.BB_FILES:
+        count = chess.popcount(own & file_mask)
+        if count > 1:
+            score -= (count - 1) * DOUBLED_PAWN_PENALTY
+    return score
@@ -1,6 +1,6 @@
 import pygame
 import chess
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Dict, Any
 import os
 from gui.ui_manager import UIButton
 
@@ -51,6 +51,10 @@ class GameGUI:
         self.last_move: Optional[chess.Move] = None
         self.game_status = "Ready to play"
         self.thinking = False
+        # Latest search info of the AI, as sent by MinimaxAI.find_best_move,
+        # and the side to move in the searched position
+        self.analysis: Optional[Dict[str, Any]] = None
+        self.analysis_color = chess.WHITE
         
         # Control buttons
         self._create_control_buttons()
@@ -205,6 +209,10 @@ class GameGUI:
         for button in self.control_buttons:
             button.draw(self.screen)
         
+        # Live analysis, beside the buttons
+        if self.analysis:
+            self.draw_analysis(panel_x + 150, 200, panel_width - 180)
+        
         # Move history (simplified)
         history_y = 400
         history_title = self.button_font.render("Move History", True, self.text_color)
@@ -219,6 +227,52 @@ class GameGUI:
             text = self.status_font.render(move_text, True, self.gray_color)
             self.screen.blit(text, (panel_x, history_y + 30 + i * 20))
     
+    def draw_analysis(self, x: int, y: int, width: int):
+        """Draw the AI's latest search info: an eval bar from White's side,
+        the score and depth, search statistics and the principal variation."""
+        info = self.analysis
+        score = info["score"] if self.analysis_color == chess.WHITE else -info["score"]
+        mate = info["mate"]
+        if mate is not None:
+            if self.analysis_color != chess.WHITE:
+                mate = -mate
+            score_label = f"M{mate}" if mate > 0 else f"-M{-mate}"
+            white_share = 1.0 if mate > 0 else 0.0
+        else:
+            score_label = f"{score / 100:+.2f}"
+            # Expected score for White, so the bar moves less once one side is clearly winning
+            white_share = 1 / (1 + 10 ** (-score / 400))
+        
+        title = self.button_font.render("Analysis", True, self.text_color)
+        self.screen.blit(title, (x, y))
+        
+        # Eval bar: White's share from the left
+        bar_rect = pygame.Rect(x, y + 28, width, 18)
+        pygame.draw.rect(self.screen, self.BLACK, bar_rect)
+        white_width = int(width * white_share)
+        if white_width:
+            pygame.draw.rect(self.screen, self.WHITE, (x, y + 28, white_width, 18))
+        pygame.draw.rect(self.screen, self.gray_color, bar_rect, 1)
+        
+        summary = self.button_font.render(f"{score_label}   Depth {info['depth']}", True, self.text_color)
+        self.screen.blit(summary, (x, y + 54))
+        stats = (f"{info['nodes']:,} nodes   {info['nps'] / 1000:.1f}k nps   "
+                 f"hash {info['hashfull'] / 10:.1f}%")
+        self.screen.blit(self.status_font.render(stats, True, self.gray_color), (x, y + 80))
+        
+        # Principal variation, wrapped to the width
+        line_y = y + 104
+        line = ""
+        for move in info["pv"]:
+            candidate = f"{line} {move}" if line else str(move)
+            if line and self.status_font.size(candidate)[0] > width:
+                self.screen.blit(self.status_font.render(line, True, self.gray_color), (x, line_y))
+                line_y += 20
+                candidate = str(move)
+            line = candidate
+        if line:
+            self.screen.blit(self.status_font.render(line, True, self.gray_color), (x, line_y))
+    
     def draw_game_over_overlay(self, result: str):
         """Draw game over overlay."""
         overlay = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
@@ -337,6 +391,11 @@ class GameGUI:
         self.game_status = status
         self.thinking = thinking
     
+    def set_analysis(self, info: Optional[Dict[str, Any]], color: chess.Color = chess.WHITE):
+        """Show the AI's search info, from a search with color to move. None clears it."""
+        self.analysis = info
+        self.analysis_color = color
+    
     def set_last_move(self, move: Optional[chess.Move]):
         """Set the last move for highlighting."""
         self.last_move = move 
\ No newline at end of file
@@ -88,7 +88,8 @@ class UIManager:
             "player_color": chess.WHITE,
             "ai_color": chess.BLACK,
             "sound_enabled": True,
-            "animations_enabled": True
+            "animations_enabled": True,
+            "ponder": True
         }
         
         try:
@@ -159,6 +160,14 @@ class UIManager:
                     color=self.gray_color if self.settings["player_color"] == chess.WHITE else self.primary_color,
                     action=lambda: self.set_player_color(chess.BLACK)),
             
+            # Pondering buttons
+            UIButton(200, 510, 150, 50, "Ponder On", 
+                    color=self.primary_color if self.settings["ponder"] else self.gray_color,
+                    action=lambda: self.set_ponder(True)),
+            UIButton(370, 510, 150, 50, "Ponder Off", 
+                    color=self.gray_color if self.settings["ponder"] else self.primary_color,
+                    action=lambda: self.set_ponder(False)),
+            
             # Back button
             UIButton(center_x - 150, 600, 300, 60, "Back", 
                     action=lambda: self.set_mode(GameMode.MENU))
@@ -183,6 +192,12 @@ class UIManager:
         self._save_settings()
         self._update_settings_buttons()
     
+    def set_ponder(self, enabled: bool):
+        """Set whether the AI thinks on the player's time."""
+        self.settings["ponder"] = enabled
+        self._save_settings()
+        self._update_settings_buttons()
+    
     def _update_settings_buttons(self):
         """Update settings buttons appearance based on current settings."""
         settings_buttons = self.buttons[GameMode.SETTINGS.value]
@@ -204,6 +219,11 @@ class UIManager:
         else:
             white_button.color = self.gray_color
             black_button.color = self.primary_color
+        
+        # Update pondering buttons
+        on_button, off_button = settings_buttons[6:8]
+        on_button.color = self.primary_color if self.settings["ponder"] else self.gray_color
+        off_button.color = self.gray_color if self.settings["ponder"] else self.primary_color
     
     def handle_event(self, event: pygame.event.Event) -> Optional[GameMode]:
         """Handle UI events and return mode change if any."""
@@ -258,6 +278,10 @@ class UIManager:
         side_title = self.subtitle_font.render("Choose Your Side", True, self.text_color)
         self.screen.blit(side_title, (200, 330))
         
+        # Pondering section
+        ponder_title = self.subtitle_font.render("Think on Your Time", True, self.text_color)
+        self.screen.blit(ponder_title, (200, 460))
+        
         # Draw buttons
         for button in self.buttons[GameMode.SETTINGS.value]:
             button.draw(self.screen)
@@ -6,6 +6,8 @@ from ai.minimax import MinimaxAI # Đảm bảo đường dẫn này chính xác
 # --- Cấu hình --- 
 STOCKFISH_PATH = "stockfish-windows-x86-64-avx2.exe" # Đường dẫn tới file Stockfish
 MINIMAX_BOT_DEPTH = 5  # Độ sâu tìm kiếm cho Minimax Bot của bạn
+MINIMAX_NULL_MOVE = True  # Bật/tắt null-move pruning để đo ảnh hưởng tới sức mạnh
+MINIMAX_LMR = True  # Bật/tắt late move reductions
 
 # Các mức Elo của Stockfish để thi đấu
 # Bạn có thể thay đổi hoặc thêm các mức Elo khác vào danh sách này
@@ -105,11 +107,13 @@ def play_match(minimax_ai: MinimaxAI, stockfish_engine: chess.engine.SimpleEngin
 def main():
     print("♔ Chess AI Master - Bot vs Stockfish (Thi đấu theo Elo) ♔")
     print(f"Bot Minimax sẽ sử dụng độ sâu: {MINIMAX_BOT_DEPTH}")
+    print(f"Null-move pruning: {MINIMAX_NULL_MOVE}, Late move reductions: {MINIMAX_LMR}")
     print(f"Stockfish sẽ có {STOCKFISH_MOVE_THINK_TIME}s cho mỗi nước đi.\n")
     
     # Tạo một instance của MinimaxAI. Nó sẽ được tái sử dụng.
     # find_best_move sẽ cập nhật ai_color dựa trên board.turn mỗi khi được gọi.
-    minimax_player_instance = MinimaxAI(max_depth=MINIMAX_BOT_DEPTH)
+    minimax_player_instance = MinimaxAI(max_depth=MINIMAX_BOT_DEPTH, null_move=MINIMAX_NULL_MOVE,
+                                        late_move_reductions=MINIMAX_LMR)
 
     for elo_level in STOCKFISH_ELO_LEVELS_TO_TEST:
         print(f"\n{'='*40}")